@@ -0,0 +1,232 @@
+"""Benchmarks for T2R InsightHub.
+
+Run against throwaway databases so the live t2r_data.db is never touched:
+
+    python benchmarks.py reports --scales 1000 10000 50000
+    python benchmarks.py reconcile --scales 10000 100000 300000
+    python benchmarks.py startup --check
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+from t2r_database import PROGRAM_PRICES, T2RDatabase
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Startup budgets in seconds; `startup --check` fails when any is exceeded
+STARTUP_BUDGETS = {
+    'import_database_module': 1.0,
+    'open_new_database': 0.5,
+    'open_existing_database': 0.05,
+    'dashboard_first_render': 5.0,
+    'dashboard_rerun': 2.0,
+}
+
+# Each probe runs in a fresh interpreter so imports are measured cold
+STARTUP_PROBES = {
+    'import_database_module': """
+started = time.perf_counter()
+import t2r_database
+result['seconds'] = time.perf_counter() - started
+result['heavy_modules'] = [m for m in ('sklearn', 'fpdf', 'plotly') if m in sys.modules]
+""",
+    'open_new_database': """
+from t2r_database import T2RDatabase
+started = time.perf_counter()
+T2RDatabase('startup.db')
+result['seconds'] = time.perf_counter() - started
+""",
+    'open_existing_database': """
+from t2r_database import T2RDatabase
+T2RDatabase('startup.db').conn.close()
+started = time.perf_counter()
+T2RDatabase('startup.db')
+result['seconds'] = time.perf_counter() - started
+""",
+    'dashboard_first_render': """
+started = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+app = AppTest.from_file(os.path.join(repo_dir, 'dashboard.py'), default_timeout=60)
+app.session_state['authenticated'] = True
+app.run()
+result['seconds'] = time.perf_counter() - started
+result['exceptions'] = [e.message for e in app.exception]
+""",
+    'dashboard_rerun': """
+from streamlit.testing.v1 import AppTest
+app = AppTest.from_file(os.path.join(repo_dir, 'dashboard.py'), default_timeout=60)
+app.session_state['authenticated'] = True
+app.run()
+started = time.perf_counter()
+app.run()
+result['seconds'] = time.perf_counter() - started
+result['exceptions'] = [e.message for e in app.exception]
+""",
+}
+
+PROGRAMS = ['AI', 'Beginner', 'Gold', 'VIP']
+SOURCES = ['Facebook', 'Radio', 'YouTube', 'Referral', 'Instagram', 'Google Ads']
+
+
+def seed_database(db, students, campaigns=200, seed=42):
+    rng = random.Random(seed)
+    start = date.today() - timedelta(days=3 * 365)
+    db.conn.executemany('''INSERT INTO students (name, email, phone, program, join_date, payment_status,
+                        amount_paid, source, assessment_score, risk_score, performance_rating)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                        ((f"Student {i}", f"student{i}@example.com", f"+1555{i:07d}",
+                          rng.choice(PROGRAMS), start + timedelta(days=rng.randrange(3 * 365)),
+                          rng.choice(['Paid', 'Partial', 'Unpaid']), round(rng.uniform(0, 3000), 2),
+                          rng.choice(SOURCES), rng.randint(0, 100), rng.randint(1, 10), rng.randint(1, 5))
+                         for i in range(students)))
+    db.conn.executemany('''INSERT INTO marketing (platform, campaign_name, start_date, end_date, spend,
+                        leads_generated) VALUES (?, ?, ?, ?, ?, ?)''',
+                        ((rng.choice(SOURCES), f"Campaign {i}", start + timedelta(days=i),
+                          start + timedelta(days=i + 30), round(rng.uniform(100, 5000), 2), rng.randint(0, 500))
+                         for i in range(campaigns)))
+    db.conn.commit()
+
+
+def bench_reports(scales, report_types=('monthly', 'roster')):
+    print(f"{'students':>10} {'report':>10} {'seconds':>9} {'peak MB':>9} {'PDF MB':>8}")
+    for scale in scales:
+        with tempfile.TemporaryDirectory() as tmp:
+            db = T2RDatabase(os.path.join(tmp, 'bench.db'))
+            seed_database(db, scale)
+            for report_type in report_types:
+                filename = os.path.join(tmp, f"{report_type}.pdf")
+                tracemalloc.start()
+                started = time.perf_counter()
+                db.generate_report(report_type, filename=filename)
+                elapsed = time.perf_counter() - started
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                print(f"{scale:>10} {report_type:>10} {elapsed:>9.2f} {peak / 2**20:>9.1f} "
+                      f"{os.path.getsize(filename) / 2**20:>8.2f}")
+            db.conn.close()
+
+
+def bench_reconciliation(scales, amounts=('uniform', 'program'), seed=42):
+    """`uniform` draws amounts from 10-3000; `program` charges list prices only and
+    leaves a third of the lines without transaction ids, so thousands of lines
+    share each amount (the worst case for amount matching)"""
+    print(f"{'lines':>10} {'amounts':>8} {'seconds':>9} {'lines/s':>10} {'peak MB':>9}  summary")
+    prices = list(PROGRAM_PRICES.values())
+    for scale in scales:
+        for distribution in amounts:
+            rng = random.Random(seed)
+            if distribution == 'program':
+                draw_amount, without_id = lambda: rng.choice(prices), 0.35
+            else:
+                draw_amount, without_id = lambda: round(rng.uniform(10, 3000), 2), 0.05
+            with tempfile.TemporaryDirectory() as tmp:
+                db = T2RDatabase(os.path.join(tmp, 'bench.db'))
+                seed_database(db, max(scale // 10, 100), campaigns=0)
+                students = db.conn.execute("SELECT COUNT(*) FROM students").fetchone()[0]
+                start = date.today() - timedelta(days=365)
+                payments = [(rng.randint(1, students), draw_amount(),
+                             (start + timedelta(days=rng.randrange(365))).isoformat(), 'Bank Transfer',
+                             f"TX{i:09d}")
+                            for i in range(scale)]
+                db.conn.executemany('''INSERT INTO payments (student_id, amount, payment_date, method, transaction_id)
+                                    VALUES (?, ?, ?, ?, ?)''', payments)
+                db.conn.commit()
+
+                # Mostly exact matches, plus amount drift, lines without ids, dropped and unknown lines
+                statement = os.path.join(tmp, 'statement.csv')
+                with open(statement, 'w') as f:
+                    f.write("transaction_id,date,amount\n")
+                    for _, amount, paid_on, _, txn in payments:
+                        roll = rng.random()
+                        if roll < 0.02:
+                            amount += 1
+                        elif roll < 0.02 + without_id:
+                            txn = ''
+                        elif roll < 0.03 + without_id:
+                            continue
+                        f.write(f"{txn},{paid_on},{amount:.2f}\n")
+                    for i in range(scale // 100):
+                        f.write(f"EXT{i:09d},{start.isoformat()},{draw_amount():.2f}\n")
+
+                tracemalloc.start()
+                started = time.perf_counter()
+                result = db.reconcile_payments(statement)
+                elapsed = time.perf_counter() - started
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                print(f"{scale:>10} {distribution:>8} {elapsed:>9.2f} {scale / elapsed:>10.0f} "
+                      f"{peak / 2**20:>9.1f}  {result.summary}")
+                db.conn.close()
+
+
+def run_probe(code, workdir):
+    script = ("import json, os, sys, time\n"
+              f"repo_dir = {REPO_DIR!r}\n"
+              f"sys.path.insert(0, repo_dir)\n"
+              "result = {}\n"
+              + code +
+              "print(json.dumps(result))\n")
+    completed = subprocess.run([sys.executable, '-c', script], cwd=workdir,
+                               capture_output=True, text=True, check=True)
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def bench_startup(check=False):
+    failures = []
+    print(f"{'measurement':>24} {'seconds':>9} {'budget':>8}")
+    # Probes share a scratch directory so the dashboard opens a throwaway t2r_data.db
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, code in STARTUP_PROBES.items():
+            result = run_probe(code, tmp)
+            budget = STARTUP_BUDGETS[name]
+            notes = []
+            if result['seconds'] > budget:
+                failures.append(f"{name} took {result['seconds']:.3f}s (budget {budget}s)")
+            if result.get('heavy_modules'):
+                failures.append(f"{name} imported {', '.join(result['heavy_modules'])} eagerly")
+                notes.append(f"eager: {', '.join(result['heavy_modules'])}")
+            if result.get('exceptions'):
+                failures.append(f"{name} raised: {result['exceptions'][0]}")
+                notes.append("exception")
+            print(f"{name:>24} {result['seconds']:>9.3f} {budget:>8.2f} {' '.join(notes)}")
+
+    if failures:
+        print("\n".join(["", "Startup budget exceeded:"] + failures))
+        if check:
+            sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    reports = subparsers.add_parser('reports', help="PDF report generation at different roster sizes")
+    reports.add_argument('--scales', type=int, nargs='+', default=[1000, 10000, 50000])
+
+    reconcile = subparsers.add_parser('reconcile', help="Statement reconciliation at different statement sizes")
+    reconcile.add_argument('--scales', type=int, nargs='+', default=[10000, 100000, 300000])
+    reconcile.add_argument('--amounts', nargs='+', choices=['uniform', 'program'], default=['uniform', 'program'],
+                           help="amount distributions to run")
+
+    startup = subparsers.add_parser('startup', help="Import time, database open and time to first render")
+    startup.add_argument('--check', action='store_true', help="exit non-zero when a budget is exceeded")
+
+    args = parser.parse_args()
+    if args.benchmark == 'reports':
+        bench_reports(args.scales)
+    elif args.benchmark == 'reconcile':
+        bench_reconciliation(args.scales, args.amounts)
+    elif args.benchmark == 'startup':
+        bench_startup(args.check)
+
+
+if __name__ == '__main__':
+    main()
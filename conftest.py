@@ -0,0 +1,21 @@
+import pytest
+
+from t2r_database import T2RDatabase
+
+
+@pytest.fixture
+def db(tmp_path):
+    database = T2RDatabase(str(tmp_path / 't2r_test.db'))
+    yield database
+    database.conn.close()
+
+
+@pytest.fixture
+def add_students(db):
+    """Add `count` students named s0, s1, ... and return their ids"""
+    def add(count, program='AI'):
+        first = db.conn.execute("SELECT COALESCE(MAX(id), 0) FROM students").fetchone()[0]
+        for i in range(first, first + count):
+            db.add_student(f"s{i}", f"s{i}@example.com", None, program, 'Unpaid', 0, 'Facebook')
+        return list(range(first + 1, first + count + 1))
+    return add
@@ -1,9 +1,24 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
 from t2r_database import T2RDatabase
+from t2r_charts import roi_chart, campaign_chart, program_distribution_chart, performance_trend_chart
 from datetime import datetime, timedelta
 
+# Page configuration
+st.set_page_config(
+    page_title="Trade2Retire InsightHub Pro",
+    page_icon="📈",
+    layout="wide",
+    initial_sidebar_state="expanded"
+)
+
+# One database connection per browser session: reruns reuse it instead of reconnecting,
+# while concurrent users never share transactions or an attached archive
+def get_database():
+    if 'db' not in st.session_state:
+        st.session_state.db = T2RDatabase()
+    return st.session_state.db
+
 # Password protection
 def check_password():
     if 'authenticated' not in st.session_state:
@@ -24,15 +39,7 @@ if not check_password():
     st.stop()
 
 # Initialize database
-db = T2RDatabase()
-
-# Page configuration
-st.set_page_config(
-    page_title="Trade2Retire InsightHub Pro",
-    page_icon="📈",
-    layout="wide",
-    initial_sidebar_state="expanded"
-)
+db = get_database()
 
 # Custom CSS for professional look
 st.markdown("""
@@ -116,9 +123,13 @@ with st.sidebar:
             source = st.selectbox("Source", ["Facebook", "Radio", "YouTube", "Referral", "Instagram", "Google Ads"])
             
             if st.form_submit_button("Add Student"):
-                db.add_student(name, email, phone, program, payment_status, amount_paid, source)
-                st.success("Student added successfully!")
-                st.rerun()
+                try:
+                    db.add_student(name, email, phone, program, payment_status, amount_paid, source)
+                except ValueError as e:
+                    st.error(str(e))
+                else:
+                    st.success("Student added successfully!")
+                    st.rerun()
     
     elif data_type == "Marketing Campaign":
         with st.form("campaign_form", clear_on_submit=True):
@@ -151,9 +162,13 @@ with st.sidebar:
                 transaction_id = st.text_input("Transaction ID (Optional)")
                 
                 if st.form_submit_button("Record Payment"):
-                    db.record_payment(student_id, amount, method, transaction_id)
-                    st.success("Payment recorded successfully!")
-                    st.rerun()
+                    try:
+                        db.record_payment(student_id, amount, method, transaction_id)
+                    except ValueError as e:
+                        st.error(str(e))
+                    else:
+                        st.success("Payment recorded successfully!")
+                        st.rerun()
             else:
                 st.warning("No students available to record payment")
     
@@ -218,9 +233,7 @@ with tab1:
         roi_df = db.calculate_roi()
         if not roi_df.empty:
             st.write("**ROI by Marketing Source**")
-            fig = px.bar(roi_df, x='source', y='roi', 
-                         labels={'source': 'Marketing Source', 'roi': 'ROI (%)'},
-                         color='roi', color_continuous_scale='Blues')
+            fig = roi_chart(roi_df)
             st.plotly_chart(fig, use_container_width=True)
         
             # Display ROI metrics
@@ -231,9 +244,7 @@ with tab1:
         
         # Spend vs Leads
         st.write("**Campaign Performance**")
-        fig = px.scatter(campaigns, x='spend', y='leads_generated', size='leads_generated',
-                         color='platform', hover_name='campaign_name',
-                         title='Spend vs Leads Generated')
+        fig = campaign_chart(campaigns)
         st.plotly_chart(fig, use_container_width=True)
     else:
         st.info("No marketing campaigns added yet")
@@ -245,7 +256,7 @@ with tab2:
         # Program distribution
         st.write("**Program Enrollment Distribution**")
         program_counts = students['program'].value_counts()
-        fig = px.pie(program_counts, names=program_counts.index, values=program_counts.values)
+        fig = program_distribution_chart(program_counts)
         st.plotly_chart(fig, use_container_width=True)
         
         # Performance metrics - with safeguards
@@ -281,6 +292,16 @@ with tab2:
         else:
             st.warning("Performance data not available for top performers")
         
+        # Progression over time
+        st.write("**Performance Trends by Program**")
+        trend_period = st.selectbox("Trend period", ['week', 'month', 'year'], index=1)
+        trend = db.get_program_performance_trend(trend_period)
+        if not trend.empty:
+            fig = performance_trend_chart(trend, trend_period)
+            st.plotly_chart(fig, use_container_width=True)
+        else:
+            st.info("No performance history recorded yet")
+        
         # Success prediction
         st.write("**Student Success Prediction**")
         if st.button("Generate Predictions"):
@@ -316,8 +337,13 @@ with tab3:
         with col2:
             end_date = st.date_input("End Date", value=datetime.now())
     
+    include_roster = st.checkbox("Include full student roster")
+    include_archived = st.checkbox("Include archived records", help="Union in alumni and ended campaigns from the archive")
+    
     if st.button("Generate Report"):
-        report_file = db.generate_report(report_type.lower())
+        with st.spinner("Rendering report..."):
+            report_file = db.generate_report(report_type.lower(), include_roster=include_roster,
+                                             include_archived=include_archived)
         st.success("Financial report generated successfully!")
         with open(report_file, "rb") as file:
             st.download_button(
@@ -339,6 +365,15 @@ with tab4:
             st.success("Database has been reset. Please restart the application.")
             st.stop()
     
+    # Archival of inactive records
+    st.write("**Archive Inactive Records**")
+    inactive_days = st.number_input("Archive records inactive for (days)", min_value=90, value=730)
+    if st.button("Archive Inactive Records",
+                 help="Moves inactive students, their payments, ended campaigns and old deletions to the compressed archive"):
+        with st.spinner("Archiving..."):
+            moved = db.archive_inactive_records(inactive_days=int(inactive_days))
+        st.success(f"Archived: {moved}")
+    
     # Backup and Restore
     st.write("**Backup & Restore**")
     if st.button("Create Database Backup"):
@@ -358,6 +393,22 @@ with tab4:
             st.success("Database restored from backup! Refresh to see changes.")
             st.rerun()
     
+    # LMS performance import
+    st.write("**Performance History**")
+    lms_file = st.file_uploader("Upload LMS Performance Export", type=["csv"])
+    if lms_file is not None:
+        if st.button("Import Performance History"):
+            try:
+                loaded = db.import_performance_history(lms_file)
+            except ValueError as e:
+                st.error(f"Import failed: {e}")
+            else:
+                st.success(f"Imported {loaded} performance records")
+    compact_days = st.number_input("Compact history older than (days)", min_value=30, value=365)
+    if st.button("Compact Performance History"):
+        removed = db.compact_performance_history(older_than_days=int(compact_days))
+        st.success(f"Compacted {removed} raw records into monthly aggregates")
+    
     # Data export
     st.write("**Data Export**")
     if st.button("Export Student Data to CSV"):
@@ -397,6 +448,23 @@ with tab5:
             st.rerun()
     else:
         st.info("No student data available")
+    
+    # RESTORE DELETED STUDENT
+    deleted_students = db.get_deleted_students()
+    if not deleted_students.empty:
+        st.subheader("Restore Deleted Student")
+        deleted_options = {row['id']: f"{row['name']} ({row['email']}, deleted {row['deleted_at']})"
+                           for _, row in deleted_students.iterrows()}
+        student_to_restore = st.selectbox("Select student to restore", options=list(deleted_options.keys()),
+                                          format_func=lambda x: deleted_options[x])
+        if st.button("Restore Student"):
+            try:
+                db.undelete_student(student_to_restore)
+            except ValueError as e:
+                st.error(str(e))
+            else:
+                st.success("Student restored with the payments deleted alongside them!")
+                st.rerun()
 
 with tab6:
     if not campaigns.empty:
@@ -428,7 +496,30 @@ with tab7:
             st.rerun()
     else:
         st.info("No payment records available")
+    
+    # RECONCILE AGAINST STATEMENT
+    st.subheader("Reconcile Statement")
+    statement_file = st.file_uploader("Upload bank/PayPal/crypto statement", type=["csv", "ofx", "qfx"])
+    col1, col2 = st.columns(2)
+    with col1:
+        statement_method = st.selectbox("Statement Method", ["Bank Transfer", "Credit Card", "PayPal", "Crypto"])
+    with col2:
+        tolerance = st.number_input("Date tolerance (days)", min_value=0, value=3)
+    apply_corrections = st.checkbox("Apply corrections from statement",
+                                    help="Adopt statement amounts, backfill transaction IDs and add missing payments")
+    if statement_file is not None and st.button("Reconcile Payments"):
+        try:
+            with st.spinner("Reconciling statement..."):
+                result = db.reconcile_payments(statement_file, apply_corrections=apply_corrections,
+                                               date_tolerance_days=int(tolerance), method=statement_method)
+        except ValueError as e:
+            st.error(str(e))
+        else:
+            st.write(result.summary)
+            if apply_corrections:
+                st.success(f"Applied {result.corrections} corrections")
+            st.dataframe(result.flagged, use_container_width=True, height=400)
 
 # Footer
 st.markdown("---")
-st.caption("Trade2Retire InsightHub Pro • Professional Forex Academy Management System")
\ No newline at end of file
+st.caption("Trade2Retire InsightHub Pro • Professional Forex Academy Management System")
@@ -0,0 +1,31 @@
+import plotly.express as px
+
+
+# Chart builders shared by the dashboard and the PDF reports
+def roi_chart(roi_df):
+    return px.bar(roi_df, x='source', y='roi',
+                  labels={'source': 'Marketing Source', 'roi': 'ROI (%)'},
+                  color='roi', color_continuous_scale='Blues')
+
+
+def campaign_chart(campaigns):
+    return px.scatter(campaigns, x='spend', y='leads_generated', size='leads_generated',
+                      color='platform', hover_name='campaign_name',
+                      title='Spend vs Leads Generated')
+
+
+def program_distribution_chart(program_counts):
+    return px.pie(program_counts, names=program_counts.index, values=program_counts.values)
+
+
+def performance_trend_chart(trend, period='month'):
+    fig = px.line(trend, x='period', y='avg_assessment', color='program', markers=True,
+                  labels={'period': period.capitalize(), 'avg_assessment': 'Average Assessment Score',
+                          'program': 'Program'})
+    # Dashed least-squares trend line per program, in the program's colour
+    for trace in list(fig.data):
+        program_trend = trend[trend['program'] == trace.name]
+        fig.add_scatter(x=program_trend['period'], y=program_trend['assessment_trend'], mode='lines',
+                        line=dict(dash='dash', color=trace.line.color), name=f"{trace.name} trend",
+                        legendgroup=trace.legendgroup)
+    return fig
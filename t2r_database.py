@@ -1,22 +1,80 @@
+import gzip
+import os
+import re
+import shutil
 import sqlite3
+import tempfile
+import threading
+from contextlib import contextmanager
+import numpy as np
 import pandas as pd
-from datetime import date, datetime
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.model_selection import train_test_split
-from fpdf import FPDF
+from datetime import date, datetime, timedelta
+
+# Bump when create_tables/initialize_*_columns change so existing
+# databases pick up the new schema on next start
+SCHEMA_VERSION = 4
+
+PROGRAM_PRICES = {'AI': 497, 'Beginner': 297, 'Gold': 1297, 'VIP': 2997}
+
+# Tables whose deletes leave a deleted_at tombstone instead of removing the row
+SOFT_DELETE_TABLES = ('students', 'marketing', 'payments')
+ARCHIVE_TABLES = ('students', 'payments', 'performance_history', 'marketing')
+# Columns that identify an archived row beyond its id: a row may only replace
+# an archived copy of itself (left behind by an interrupted archive run)
+ARCHIVE_IDENTITY = {
+    'students': ('name', 'email', 'join_date'),
+    'payments': ('student_id', 'payment_date'),
+    'performance_history': ('student_id', 'recorded_at'),
+    'marketing': ('campaign_name', 'start_date'),
+}
+# Serializes archive jobs across sessions: every session has its own connection
+# but they all share the one gzip file on disk
+ARCHIVE_LOCK = threading.RLock()
+
+def weighted_average(column, weight='sample_count', window=''):
+    """SQL for the sample-weighted mean of `column`, leaving out rows where it is NULL"""
+    return (f"SUM({column} * {weight}) {window} / "
+            f"SUM(CASE WHEN {column} IS NOT NULL THEN {weight} END) {window}")
+
+def period_position(periods, period):
+    """Place period labels (see T2RDatabase.PERIOD_FORMATS) on an evenly spaced
+    axis, so a run of empty periods keeps its width in a regression"""
+    if period == 'year':
+        return periods.astype(int)
+    if period == 'month':
+        dates = pd.to_datetime(periods, format='%Y-%m')
+        return dates.dt.year * 12 + dates.dt.month
+    if period == 'week':
+        # Monday of the '%Y-W%W' week
+        dates = pd.to_datetime(periods + '-1', format='%Y-W%W-%w')
+        return (dates - pd.Timestamp(0)).dt.days // 7
+    return (pd.to_datetime(periods, format='%Y-%m-%d') - pd.Timestamp(0)).dt.days
 
 class T2RDatabase:
-    def __init__(self):
-        self.conn = sqlite3.connect('t2r_data.db', check_same_thread=False)
-        self.create_tables()
-        self.initialize_performance_columns()
+    def __init__(self, db_path='t2r_data.db', archive_path=None):
+        self.db_path = db_path
+        self.archive_path = archive_path or os.path.splitext(db_path)[0] + '_archive.db.gz'
+        self.archive_attached = False
+        self.archive_writable = False
+        self.archive_lock = threading.RLock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.ensure_schema()
+
+    def ensure_schema(self):
+        """Run the DDL only when the file predates the current schema version"""
+        version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        if version < SCHEMA_VERSION:
+            self.create_tables()
+            self.initialize_performance_columns()
+            self.initialize_tombstone_columns()
+            self.conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
         
     def create_tables(self):
         # Create students table with performance fields
         self.conn.execute('''CREATE TABLE IF NOT EXISTS students (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             name TEXT NOT NULL,
-            email TEXT UNIQUE,
+            email TEXT,
             phone TEXT,
             program TEXT CHECK(program IN ('AI', 'Beginner', 'Gold', 'VIP')),
             join_date DATE,
@@ -25,7 +83,8 @@ class T2RDatabase:
             source TEXT,
             assessment_score INTEGER DEFAULT 0,
             risk_score INTEGER DEFAULT 0,
-            performance_rating INTEGER DEFAULT 0
+            performance_rating INTEGER DEFAULT 0,
+            deleted_at DATETIME
         )''')
 
         # Marketing table
@@ -36,7 +95,8 @@ class T2RDatabase:
             start_date DATE,
             end_date DATE,
             spend REAL,
-            leads_generated INTEGER
+            leads_generated INTEGER,
+            deleted_at DATETIME
         )''')
         
         # Payment history table
@@ -47,8 +107,28 @@ class T2RDatabase:
             payment_date DATE,
             method TEXT,
             transaction_id TEXT,
+            deleted_at DATETIME,
+            FOREIGN KEY(student_id) REFERENCES students(id)
+        )''')
+        self.conn.execute('''CREATE INDEX IF NOT EXISTS idx_payments_student
+                          ON payments (student_id)''')
+        self.conn.execute('''CREATE INDEX IF NOT EXISTS idx_payments_transaction_lookup
+                          ON payments (transaction_id)''')
+        
+        # Performance history table (append-only, one row per observation)
+        self.conn.execute('''CREATE TABLE IF NOT EXISTS performance_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            student_id INTEGER NOT NULL,
+            recorded_at DATETIME NOT NULL,
+            assessment_score REAL,
+            risk_score REAL,
+            performance_rating REAL,
+            source TEXT DEFAULT 'manual',
+            sample_count INTEGER DEFAULT 1,
             FOREIGN KEY(student_id) REFERENCES students(id)
         )''')
+        self.conn.execute('''CREATE INDEX IF NOT EXISTS idx_performance_history_student_time
+                          ON performance_history (student_id, recorded_at)''')
         
         # Audit log table
         self.conn.execute('''CREATE TABLE IF NOT EXISTS audit_log (
@@ -73,6 +153,76 @@ class T2RDatabase:
             self.conn.execute("ALTER TABLE students ADD COLUMN performance_rating INTEGER DEFAULT 0")
             
         self.conn.commit()
+    
+    def initialize_tombstone_columns(self):
+        """Ensure soft-delete columns exist and active rows stay indexed.
+
+        Emails and transaction ids only have to be unique among live rows, so a
+        deleted student or payment doesn't block re-adding the same one.
+        """
+        for table in SOFT_DELETE_TABLES:
+            columns = [col[1] for col in self.conn.execute(f"PRAGMA table_info({table})").fetchall()]
+            if 'deleted_at' not in columns:
+                self.conn.execute(f"ALTER TABLE {table} ADD COLUMN deleted_at DATETIME")
+        self.drop_students_email_constraint()
+
+        self.conn.execute('''CREATE UNIQUE INDEX IF NOT EXISTS idx_students_active_email
+                          ON students (email) WHERE deleted_at IS NULL''')
+        self.conn.execute("DROP INDEX IF EXISTS idx_payments_transaction_id")
+        try:
+            self.conn.execute('''CREATE UNIQUE INDEX IF NOT EXISTS idx_payments_active_transaction_id
+                              ON payments (transaction_id) WHERE transaction_id <> '' AND deleted_at IS NULL''')
+        except sqlite3.IntegrityError:
+            # Legacy duplicates: lookups stay indexed, reconciliation flags the duplicates
+            pass
+        self.conn.execute('''CREATE INDEX IF NOT EXISTS idx_payments_transaction_lookup
+                          ON payments (transaction_id)''')
+        self.conn.execute('''CREATE INDEX IF NOT EXISTS idx_payments_active_student
+                          ON payments (student_id) WHERE deleted_at IS NULL''')
+        self.conn.execute('''CREATE INDEX IF NOT EXISTS idx_students_active_program
+                          ON students (program) WHERE deleted_at IS NULL''')
+        self.conn.commit()
+    
+    def drop_students_email_constraint(self):
+        """Rebuild a students table created with `email TEXT UNIQUE`: the
+        constraint would also cover deleted students"""
+        sql = self.conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'students'").fetchone()[0]
+        if not re.search(r'\bemail\s+TEXT\s+UNIQUE\b', sql, re.IGNORECASE):
+            return
+
+        rebuilt = re.sub(r'\bemail\s+TEXT\s+UNIQUE\b', 'email TEXT', sql, count=1, flags=re.IGNORECASE)
+        rebuilt = re.sub(r'^CREATE TABLE\s+("?students"?)', 'CREATE TABLE students_rebuild', rebuilt,
+                         count=1, flags=re.IGNORECASE)
+        sequence = self.conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'students'").fetchone()
+        self.conn.commit()
+        with self.conn:
+            self.conn.execute("BEGIN")
+            self.conn.execute(rebuilt)
+            self.conn.execute("INSERT INTO students_rebuild SELECT * FROM students")
+            self.conn.execute("DROP TABLE students")
+            self.conn.execute("ALTER TABLE students_rebuild RENAME TO students")
+            if sequence:
+                # Ids of rows removed before the rebuild are never handed out again
+                self.conn.execute("DELETE FROM sqlite_sequence WHERE name = 'students'")
+                self.conn.execute('''INSERT INTO sqlite_sequence (name, seq)
+                                  SELECT 'students', MAX(?, COALESCE(MAX(id), 0)) FROM students''', sequence)
+
+    def table_columns(self, table, schema='main'):
+        return [col[1] for col in self.conn.execute(f"PRAGMA {schema}.table_info({table})").fetchall()]
+    
+    def source(self, table):
+        """FROM-clause source for `table`: live rows only, plus the archive while it is attached"""
+        columns = ', '.join(col for col in self.table_columns(table) if col != 'deleted_at')
+        live = "WHERE deleted_at IS NULL" if table in SOFT_DELETE_TABLES else ""
+        query = f"SELECT {columns} FROM main.{table} {live}"
+        if self.archive_attached:
+            query += f" UNION ALL SELECT {columns} FROM archive.{table} {live}"
+        return f"({query})"
+
+    def history_source(self):
+        """FROM-clause source for the performance history of students that are still on the books"""
+        return (f"(SELECT h.* FROM {self.source('performance_history')} h "
+                f"WHERE h.student_id IN (SELECT id FROM {self.source('students')}))")
         
     def log_audit(self, user, action):
         self.conn.execute('''INSERT INTO audit_log (user, action)
@@ -81,6 +231,9 @@ class T2RDatabase:
 
     # Student methods
     def add_student(self, name, email, phone, program, payment_status, amount_paid, source):
+        if email and self.conn.execute("SELECT 1 FROM students WHERE email = ? AND deleted_at IS NULL",
+                                       (email,)).fetchone():
+            raise ValueError(f"A student with email {email} already exists")
         self.conn.execute('''INSERT INTO students (name, email, phone, program, join_date, payment_status, amount_paid, source)
             VALUES (?, ?, ?, ?, ?, ?, ?, ?)''', 
             (name, email, phone, program, date.today(), payment_status, amount_paid, source))
@@ -92,11 +245,21 @@ class T2RDatabase:
                           SET assessment_score = ?, risk_score = ?, performance_rating = ?
                           WHERE id = ?''', 
                           (assessment_score, risk_score, performance_rating, student_id))
+        # Keep the progression: the students row only holds the latest snapshot
+        self.conn.execute('''INSERT INTO performance_history
+                          (student_id, recorded_at, assessment_score, risk_score, performance_rating, source)
+                          VALUES (?, ?, ?, ?, ?, 'manual')''',
+                          (student_id, datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                           assessment_score, risk_score, performance_rating))
         self.conn.commit()
         self.log_audit("System", f"Updated performance for student ID: {student_id}")
         
+    def get_deleted_students(self):
+        return pd.read_sql('''SELECT id, name, email, program, deleted_at FROM students
+                           WHERE deleted_at IS NOT NULL ORDER BY deleted_at DESC''', self.conn)
+
     def get_students(self):
-        df = pd.read_sql("SELECT * FROM students", self.conn)
+        df = pd.read_sql(f"SELECT * FROM {self.source('students')}", self.conn)
         
         # Ensure performance columns exist in the DataFrame
         for col in ['assessment_score', 'risk_score', 'performance_rating']:
@@ -106,11 +269,30 @@ class T2RDatabase:
         return df
 
     def delete_student(self, student_id):
-        self.conn.execute("DELETE FROM students WHERE id = ?", (student_id,))
-        self.conn.execute("DELETE FROM payments WHERE student_id = ?", (student_id,))
+        deleted_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self.conn.execute("UPDATE students SET deleted_at = ? WHERE id = ? AND deleted_at IS NULL",
+                          (deleted_at, student_id))
+        self.conn.execute("UPDATE payments SET deleted_at = ? WHERE student_id = ? AND deleted_at IS NULL",
+                          (deleted_at, student_id))
         self.conn.commit()
         self.log_audit("System", f"Deleted student ID: {student_id}")
 
+    def undelete_student(self, student_id):
+        """Bring back a deleted student together with the payments deleted with them"""
+        row = self.conn.execute("SELECT deleted_at FROM students WHERE id = ? AND deleted_at IS NOT NULL",
+                                (student_id,)).fetchone()
+        if not row:
+            return
+        try:
+            with self.conn:
+                self.conn.execute("UPDATE students SET deleted_at = NULL WHERE id = ?", (student_id,))
+                self.conn.execute("UPDATE payments SET deleted_at = NULL WHERE student_id = ? AND deleted_at = ?",
+                                  (student_id, row[0]))
+        except sqlite3.IntegrityError as e:
+            raise ValueError(f"Student ID {student_id} clashes with an active student or payment: {e}") from e
+        self.recalculate_payment_status([student_id])
+        self.log_audit("System", f"Restored student ID: {student_id}")
+
     # Campaign methods
     def add_campaign(self, platform, campaign_name, start_date, end_date, spend, leads_generated):
         self.conn.execute('''INSERT INTO marketing (platform, campaign_name, start_date, end_date, spend, leads_generated)
@@ -120,68 +302,76 @@ class T2RDatabase:
         self.log_audit("System", f"Added campaign: {campaign_name}")
 
     def get_campaigns(self):
-        return pd.read_sql("SELECT * FROM marketing", self.conn)
+        return pd.read_sql(f"SELECT * FROM {self.source('marketing')}", self.conn)
     
     def delete_campaign(self, campaign_id):
-        self.conn.execute("DELETE FROM marketing WHERE id = ?", (campaign_id,))
+        self.conn.execute("UPDATE marketing SET deleted_at = ? WHERE id = ? AND deleted_at IS NULL",
+                          (datetime.now().strftime('%Y-%m-%d %H:%M:%S'), campaign_id))
         self.conn.commit()
         self.log_audit("System", f"Deleted campaign ID: {campaign_id}")
 
+    def undelete_campaign(self, campaign_id):
+        self.conn.execute("UPDATE marketing SET deleted_at = NULL WHERE id = ?", (campaign_id,))
+        self.conn.commit()
+        self.log_audit("System", f"Restored campaign ID: {campaign_id}")
+
     # Payment methods
     def get_payments(self):
-        return pd.read_sql("SELECT * FROM payments", self.conn)
+        return pd.read_sql(f"SELECT * FROM {self.source('payments')}", self.conn)
 
     def record_payment(self, student_id, amount, method="Bank Transfer", transaction_id=""):
+        transaction_id = (transaction_id or "").strip()
+        if transaction_id and self.conn.execute('''SELECT 1 FROM payments WHERE transaction_id = ?
+                                                AND transaction_id <> '' AND deleted_at IS NULL''',
+                                                (transaction_id,)).fetchone():
+            raise ValueError(f"Transaction ID {transaction_id} has already been recorded")
+        
         # Record payment
         self.conn.execute('''INSERT INTO payments (student_id, amount, payment_date, method, transaction_id)
                           VALUES (?, ?, ?, ?, ?)''', 
                           (student_id, amount, date.today(), method, transaction_id))
         
         # Update student payment status
-        student = self.get_student(student_id)
-        program_price = self.get_program_price(student['program'])
-        total_paid = self.get_total_paid(student_id) + amount
-        
-        if total_paid >= program_price:
-            status = 'Paid'
-        elif total_paid > 0:
-            status = 'Partial'
-        else:
-            status = 'Unpaid'
-            
-        self.conn.execute('''UPDATE students 
-                          SET amount_paid = ?, payment_status = ?
-                          WHERE id = ?''', (total_paid, status, student_id))
-        self.conn.commit()
+        self.recalculate_payment_status([student_id])
         self.log_audit("System", f"Recorded payment for student ID: {student_id}")
         
     def delete_payment(self, payment_id):
-        self.conn.execute("DELETE FROM payments WHERE id = ?", (payment_id,))
-        self.conn.commit()
-        self.log_audit("System", f"Deleted payment ID: {payment_id}")
+        # Look the student up before tombstoning so the balance can be recomputed
+        row = self.conn.execute("SELECT student_id FROM payments WHERE id = ? AND deleted_at IS NULL",
+                                (payment_id,)).fetchone()
+        if not row:
+            return
         
-        # Recalculate student status
-        student_id = self.conn.execute("SELECT student_id FROM payments WHERE id = ?", (payment_id,)).fetchone()
-        if student_id:
-            student_id = student_id[0]
-            student = self.get_student(student_id)
-            total_paid = self.get_total_paid(student_id)
-            program_price = self.get_program_price(student['program'])
-            
-            if total_paid >= program_price:
-                status = 'Paid'
-            elif total_paid > 0:
-                status = 'Partial'
-            else:
-                status = 'Unpaid'
-                
-            self.conn.execute('''UPDATE students 
-                              SET amount_paid = ?, payment_status = ?
-                              WHERE id = ?''', (total_paid, status, student_id))
-        self.conn.commit()
+        self.conn.execute("UPDATE payments SET deleted_at = ? WHERE id = ?",
+                          (datetime.now().strftime('%Y-%m-%d %H:%M:%S'), payment_id))
+        self.recalculate_payment_status([row[0]])
+        self.log_audit("System", f"Deleted payment ID: {payment_id}")
+
+    def undelete_payment(self, payment_id):
+        row = self.conn.execute('''SELECT p.student_id, s.deleted_at FROM payments p
+                                LEFT JOIN students s ON s.id = p.student_id
+                                WHERE p.id = ? AND p.deleted_at IS NOT NULL''', (payment_id,)).fetchone()
+        if not row:
+            return
+        if row[1] is not None:
+            raise ValueError(f"Payment ID {payment_id} belongs to a deleted student; restore the student instead")
+        try:
+            with self.conn:
+                self.conn.execute("UPDATE payments SET deleted_at = NULL WHERE id = ?", (payment_id,))
+        except sqlite3.IntegrityError as e:
+            raise ValueError(f"Payment ID {payment_id} clashes with an active payment: {e}") from e
+        self.recalculate_payment_status([row[0]])
+        self.log_audit("System", f"Restored payment ID: {payment_id}")
+    
+    def reconcile_payments(self, statement, fmt=None, apply_corrections=False, date_tolerance_days=3,
+                           method="Bank Transfer"):
+        """Match a bank/PayPal/crypto statement (CSV or OFX) against recorded payments"""
+        from t2r_reconciliation import PaymentReconciler
+        reconciler = PaymentReconciler(self, date_tolerance_days=date_tolerance_days, method=method)
+        return reconciler.reconcile(statement, fmt=fmt, apply_corrections=apply_corrections)
     
     def get_student(self, student_id):
-        cursor = self.conn.execute('''SELECT * FROM students WHERE id = ?''', (student_id,))
+        cursor = self.conn.execute('''SELECT * FROM students WHERE id = ? AND deleted_at IS NULL''', (student_id,))
         columns = [col[0] for col in cursor.description]
         student_row = cursor.fetchone()
         
@@ -197,94 +387,286 @@ class T2RDatabase:
         return student
     
     def get_program_price(self, program):
-        prices = {'AI': 497, 'Beginner': 297, 'Gold': 1297, 'VIP': 2997}
-        return prices.get(program, 0)
+        return PROGRAM_PRICES.get(program, 0)
+    
+    def recalculate_payment_status(self, student_ids=None):
+        """Recompute amount_paid and payment_status from the payments table in one batch"""
+        self.conn.execute("DROP TABLE IF EXISTS temp.payment_totals")
+        # Keyed on student_id so the per-student lookups below are index seeks
+        self.conn.execute("CREATE TEMP TABLE payment_totals (student_id INTEGER PRIMARY KEY, total REAL)")
+        if student_ids is None:
+            self.conn.execute("INSERT INTO payment_totals SELECT id, 0.0 FROM students")
+        else:
+            self.conn.executemany("INSERT OR IGNORE INTO payment_totals VALUES (?, 0.0)",
+                                  ((int(sid),) for sid in student_ids))
+        self.conn.execute('''UPDATE payment_totals SET total = (
+                              SELECT COALESCE(SUM(amount), 0) FROM payments
+                              WHERE payments.student_id = payment_totals.student_id
+                              AND payments.deleted_at IS NULL)''')
+        
+        price = "CASE program " + " ".join(
+            f"WHEN '{program}' THEN {value}" for program, value in PROGRAM_PRICES.items()) + " ELSE 0 END"
+        total = "(SELECT total FROM payment_totals t WHERE t.student_id = students.id)"
+        self.conn.execute(f'''UPDATE students SET
+                              amount_paid = {total},
+                              payment_status = CASE
+                                  WHEN {total} >= {price} THEN 'Paid'
+                                  WHEN {total} > 0 THEN 'Partial'
+                                  ELSE 'Unpaid' END
+                              WHERE id IN (SELECT student_id FROM payment_totals)''')
+        self.conn.execute("DROP TABLE temp.payment_totals")
+        self.conn.commit()
     
     def get_total_paid(self, student_id):
         cursor = self.conn.execute('''SELECT COALESCE(SUM(amount), 0) 
-                                   FROM payments WHERE student_id = ?''', (student_id,))
+                                   FROM payments WHERE student_id = ? AND deleted_at IS NULL''', (student_id,))
         return cursor.fetchone()[0]
     
-    # ROI calculation
-    def calculate_roi(self):
-        students = self.get_students()
-        campaigns = self.get_campaigns()
+    # Performance history methods
+    PERIOD_FORMATS = {'day': '%Y-%m-%d', 'week': '%Y-W%W', 'month': '%Y-%m', 'year': '%Y'}
 
-        program_prices = {'AI': 497, 'Beginner': 297, 'Gold': 1297, 'VIP': 2997}
-        students['program_value'] = students['program'].map(program_prices)
+    def import_performance_history(self, records, source='lms', chunk_size=5000):
+        """Bulk-load performance observations from an LMS export.
 
-        roi_data = []
-        for source in students['source'].unique():
-            source_students = students[students['source'] == source]
-            total_revenue = source_students['amount_paid'].sum()
-            
-            source_campaigns = campaigns[campaigns['platform'] == source]
-            total_spend = source_campaigns['spend'].sum()
-            
-            roi = (total_revenue - total_spend) / total_spend * 100 if total_spend else 0
-            roi_data.append({
-                'source': source,
-                'students': len(source_students),
-                'revenue': total_revenue,
-                'spend': total_spend,
-                'roi': roi
-            })
-        return pd.DataFrame(roi_data)
+        `records` is a DataFrame or a CSV path/file with `recorded_at`,
+        `assessment_score`, `risk_score`, `performance_rating` and either
+        `student_id` or `email`. Returns the number of rows loaded; raises
+        ValueError for missing columns or unparseable dates.
+        """
+        if isinstance(records, pd.DataFrame):
+            chunks = (records[i:i + chunk_size] for i in range(0, len(records), chunk_size))
+        else:
+            chunks = pd.read_csv(records, chunksize=chunk_size)
+
+        email_ids = None
+        touched = set()
+        loaded = 0
+        # One transaction: a bad chunk leaves no half-imported batch behind
+        with self.conn:
+            for chunk in chunks:
+                chunk = chunk.copy()
+                missing = [col for col in ['recorded_at'] if col not in chunk.columns]
+                if 'student_id' not in chunk.columns and 'email' not in chunk.columns:
+                    missing.append('student_id or email')
+                if missing:
+                    raise ValueError(f"LMS export is missing columns: {', '.join(missing)}")
+                if 'student_id' not in chunk.columns:
+                    if email_ids is None:
+                        email_ids = dict(self.conn.execute(
+                            "SELECT email, id FROM students WHERE deleted_at IS NULL").fetchall())
+                    chunk['student_id'] = chunk['email'].map(email_ids)
+                chunk = chunk.dropna(subset=['student_id', 'recorded_at'])
+                if chunk.empty:
+                    continue
+
+                chunk['student_id'] = chunk['student_id'].astype(int)
+                chunk['recorded_at'] = pd.to_datetime(chunk['recorded_at']).dt.strftime('%Y-%m-%d %H:%M:%S')
+                for col in ['assessment_score', 'risk_score', 'performance_rating']:
+                    if col not in chunk.columns:
+                        chunk[col] = None
+                chunk['source'] = source
+
+                rows = chunk[['student_id', 'recorded_at', 'assessment_score', 'risk_score',
+                              'performance_rating', 'source']].astype(object)
+                rows = rows.where(rows.notna(), None)
+                self.conn.executemany('''INSERT INTO performance_history
+                                      (student_id, recorded_at, assessment_score, risk_score, performance_rating, source)
+                                      VALUES (?, ?, ?, ?, ?, ?)''', rows.itertuples(index=False, name=None))
+                touched.update(chunk['student_id'].unique().tolist())
+                loaded += len(chunk)
+
+            self.refresh_performance_snapshot(touched)
+
+        self.log_audit("System", f"Imported {loaded} performance records from {source}")
+        return loaded
+
+    def refresh_performance_snapshot(self, student_ids=None):
+        """Copy each student's latest history point onto the students row.
+
+        Runs in the caller's transaction; the caller commits.
+        """
+        where = ""
+        if student_ids is not None:
+            # Stage the ids in a temp table so large imports stay under SQLite's variable limit
+            self.conn.execute("DROP TABLE IF EXISTS temp.snapshot_students")
+            self.conn.execute("CREATE TEMP TABLE snapshot_students (student_id INTEGER PRIMARY KEY)")
+            self.conn.executemany("INSERT OR IGNORE INTO snapshot_students VALUES (?)",
+                                  ((int(sid),) for sid in student_ids))
+            where = "AND id IN (SELECT student_id FROM temp.snapshot_students)"
+
+        latest = '''(SELECT {col} FROM performance_history h
+                     WHERE h.student_id = students.id AND h.{col} IS NOT NULL
+                     ORDER BY h.recorded_at DESC, h.id DESC LIMIT 1)'''
+        self.conn.execute(f'''UPDATE students SET
+                              assessment_score = COALESCE({latest.format(col='assessment_score')}, assessment_score),
+                              risk_score = COALESCE({latest.format(col='risk_score')}, risk_score),
+                              performance_rating = COALESCE({latest.format(col='performance_rating')}, performance_rating)
+                              WHERE EXISTS (SELECT 1 FROM performance_history h WHERE h.student_id = students.id)
+                              {where}''')
+        if student_ids is not None:
+            self.conn.execute("DROP TABLE temp.snapshot_students")
+
+    def get_performance_history(self, student_id=None):
+        if student_id is None:
+            return pd.read_sql(f"SELECT * FROM {self.history_source()} ORDER BY student_id, recorded_at", self.conn)
+        return pd.read_sql(f'''SELECT * FROM {self.history_source()} WHERE student_id = ?
+                           ORDER BY recorded_at''', self.conn, params=(student_id,))
+
+    def get_latest_performance(self):
+        """Latest history point per student"""
+        return pd.read_sql(f'''SELECT student_id, recorded_at, assessment_score, risk_score, performance_rating
+                           FROM (
+                               SELECT *, ROW_NUMBER() OVER (
+                                   PARTITION BY student_id ORDER BY recorded_at DESC, id DESC) AS rn
+                               FROM {self.history_source()}
+                           ) WHERE rn = 1''', self.conn)
+
+    def get_performance_rolling_average(self, window=3, student_id=None):
+        """Rolling averages over the last `window` points of each student.
+
+        Compacted points are weighted by the number of raw samples they replace.
+        """
+        preceding = max(int(window), 1) - 1
+        where = "WHERE student_id = ?" if student_id is not None else ""
+        params = (student_id,) if student_id is not None else ()
+        return pd.read_sql(f'''SELECT student_id, recorded_at, assessment_score, risk_score, performance_rating,
+                               {weighted_average('assessment_score', window='OVER w')} AS assessment_rolling,
+                               {weighted_average('risk_score', window='OVER w')} AS risk_rolling,
+                               {weighted_average('performance_rating', window='OVER w')} AS rating_rolling
+                               FROM {self.history_source()} {where}
+                               WINDOW w AS (PARTITION BY student_id ORDER BY recorded_at
+                                            ROWS BETWEEN {preceding} PRECEDING AND CURRENT ROW)
+                               ORDER BY student_id, recorded_at''', self.conn, params=params)
+
+    def get_program_performance_trend(self, period='month'):
+        """Per-program averages for each period plus a least-squares trend line"""
+        fmt = self.PERIOD_FORMATS[period]
+        trend = pd.read_sql(f'''SELECT s.program, strftime('{fmt}', h.recorded_at) AS period,
+                                {weighted_average('h.assessment_score', 'h.sample_count')} AS avg_assessment,
+                                {weighted_average('h.risk_score', 'h.sample_count')} AS avg_risk,
+                                {weighted_average('h.performance_rating', 'h.sample_count')} AS avg_rating,
+                                COUNT(DISTINCT h.student_id) AS students
+                                FROM {self.source('performance_history')} h
+                                JOIN {self.source('students')} s ON s.id = h.student_id
+                                GROUP BY s.program, period
+                                ORDER BY s.program, period''', self.conn)
+        if trend.empty:
+            trend['assessment_trend'] = []
+            return trend
+
+        def fit(group):
+            x = period_position(group['period'], period).to_numpy(dtype=float)
+            y = group['avg_assessment'].to_numpy(dtype=float)
+            known = ~np.isnan(y)
+            # A line needs two distinct periods with a score; otherwise there is no trend to draw
+            if len(np.unique(x[known])) < 2:
+                return pd.Series(np.nan, index=group.index)
+            slope, intercept = np.polyfit(x[known], y[known], 1)
+            return pd.Series(slope * x + intercept, index=group.index)
+
+        trend['assessment_trend'] = pd.concat([fit(group) for _, group in trend.groupby('program')])
+        return trend
+
+    def compact_performance_history(self, older_than_days=365, period='month'):
+        """Collapse raw points older than the cutoff into one weighted point
+        per student and period. Returns the number of rows removed."""
+        fmt = self.PERIOD_FORMATS[period]
+        cutoff = (datetime.now() - timedelta(days=older_than_days)).strftime('%Y-%m-%d %H:%M:%S')
+
+        with self.conn:
+            max_id = self.conn.execute("SELECT COALESCE(MAX(id), 0) FROM performance_history").fetchone()[0]
+            self.conn.execute("DROP TABLE IF EXISTS temp.compact_groups")
+            self.conn.execute(f'''CREATE TEMP TABLE compact_groups AS
+                              SELECT student_id, strftime('{fmt}', recorded_at) AS bucket
+                              FROM performance_history
+                              WHERE recorded_at < ?
+                              GROUP BY student_id, bucket
+                              HAVING COUNT(*) > 1''', (cutoff,))
+            self.conn.execute(f'''INSERT INTO performance_history
+                              (student_id, recorded_at, assessment_score, risk_score, performance_rating,
+                               source, sample_count)
+                              SELECT h.student_id, MIN(h.recorded_at),
+                                     {weighted_average('h.assessment_score', 'h.sample_count')},
+                                     {weighted_average('h.risk_score', 'h.sample_count')},
+                                     {weighted_average('h.performance_rating', 'h.sample_count')},
+                                     'compacted', SUM(h.sample_count)
+                              FROM performance_history h
+                              JOIN compact_groups g
+                                ON g.student_id = h.student_id AND g.bucket = strftime('{fmt}', h.recorded_at)
+                              WHERE h.recorded_at < ?
+                              GROUP BY h.student_id, g.bucket''', (cutoff,))
+            removed = self.conn.execute(f'''DELETE FROM performance_history
+                                        WHERE id <= ? AND recorded_at < ?
+                                        AND EXISTS (SELECT 1 FROM compact_groups g
+                                                    WHERE g.student_id = performance_history.student_id
+                                                    AND g.bucket = strftime('{fmt}', performance_history.recorded_at))''',
+                                        (max_id, cutoff)).rowcount
+            self.conn.execute("DROP TABLE temp.compact_groups")
+
+        self.log_audit("System", f"Compacted {removed} performance records older than {older_than_days} days")
+        return removed
+
+    def get_performance_progression(self):
+        """First-to-latest change in assessment score and number of observations per student"""
+        return pd.read_sql(f'''SELECT student_id,
+                           MAX(observations) AS observations,
+                           MAX(last_score) - MAX(first_score) AS assessment_change
+                           FROM (
+                               SELECT student_id,
+                               SUM(sample_count) OVER p AS observations,
+                               FIRST_VALUE(assessment_score) OVER p AS first_score,
+                               LAST_VALUE(assessment_score) OVER p AS last_score
+                               FROM {self.history_source()}
+                               WINDOW p AS (PARTITION BY student_id ORDER BY recorded_at, id
+                                            ROWS BETWEEN UNBOUNDED PRECEDING AND UNBOUNDED FOLLOWING)
+                           ) GROUP BY student_id''', self.conn)
+    
+    # ROI calculation
+    def calculate_roi(self):
+        roi_df = pd.read_sql(f'''SELECT s.source, s.students, s.revenue, COALESCE(m.spend, 0) AS spend
+                             FROM (SELECT source, COUNT(*) AS students, COALESCE(SUM(amount_paid), 0) AS revenue
+                                   FROM {self.source('students')} GROUP BY source) s
+                             LEFT JOIN (SELECT platform, SUM(spend) AS spend
+                                        FROM {self.source('marketing')} GROUP BY platform) m ON m.platform = s.source''',
+                             self.conn)
+        spend = roi_df['spend'].where(roi_df['spend'] != 0)
+        roi_df['roi'] = ((roi_df['revenue'] - spend) / spend * 100).fillna(0)
+        return roi_df
     
     # Reporting
-    def generate_report(self, report_type='monthly'):
-        pdf = FPDF()
-        pdf.add_page()
-        pdf.set_font("Arial", size=12)
-        
-        # Report header
-        pdf.cell(200, 10, txt=f"Trade2Retire Academy {report_type.capitalize()} Report", 
-                ln=True, align='C')
-        pdf.ln(10)
-        
-        # Financial summary
-        pdf.set_font("Arial", 'B', 12)
-        pdf.cell(200, 10, txt="Financial Summary", ln=True)
-        pdf.set_font("Arial", size=10)
-        
-        # Get financial data
-        students = self.get_students()
-        revenue = students['amount_paid'].sum()
-        campaigns = self.get_campaigns()
-        spend = campaigns['spend'].sum()
-        
-        pdf.cell(200, 10, txt=f"Total Revenue: ${revenue:,.2f}", ln=True)
-        pdf.cell(200, 10, txt=f"Marketing Spend: ${spend:,.2f}", ln=True)
-        pdf.cell(200, 10, txt=f"Net Profit: ${revenue - spend:,.2f}", ln=True)
-        pdf.ln(10)
-        
-        # Program breakdown
-        pdf.set_font("Arial", 'B', 12)
-        pdf.cell(200, 10, txt="Program Performance", ln=True)
-        pdf.set_font("Arial", size=10)
-        
-        program_revenue = students.groupby('program')['amount_paid'].sum()
-        for program, rev in program_revenue.items():
-            pdf.cell(200, 10, txt=f"{program}: ${rev:,.2f}", ln=True)
-        
-        # Student performance
-        if 'assessment_score' in students.columns:
-            pdf.set_font("Arial", 'B', 12)
-            pdf.cell(200, 10, txt="Student Performance", ln=True)
-            pdf.set_font("Arial", size=10)
-            
-            avg_score = students['assessment_score'].mean()
-            pdf.cell(200, 10, txt=f"Average Assessment Score: {avg_score:.1f}/100", ln=True)
-            
-            top_performers = students.sort_values('assessment_score', ascending=False).head(3)
-            pdf.cell(200, 10, txt="Top Performers:", ln=True)
-            for i, row in top_performers.iterrows():
-                pdf.cell(200, 10, txt=f"{row['name']} - {row['program']} ({row['assessment_score']}/100)", ln=True)
-        
-        # Save the report
-        filename = f"T2R_Report_{datetime.now().strftime('%Y%m%d')}.pdf"
-        pdf.output(filename)
-        return filename
+    def get_financial_summary(self):
+        revenue, students = self.conn.execute(f'''SELECT COALESCE(SUM(amount_paid), 0), COUNT(*)
+                                              FROM {self.source('students')}''').fetchone()
+        spend = self.conn.execute(f"SELECT COALESCE(SUM(spend), 0) FROM {self.source('marketing')}").fetchone()[0]
+        return {'revenue': revenue, 'spend': spend, 'students': students}
+
+    def get_program_summary(self):
+        return pd.read_sql(f'''SELECT program, COUNT(*) AS students, COALESCE(SUM(amount_paid), 0) AS revenue,
+                           AVG(assessment_score) AS avg_assessment
+                           FROM {self.source('students')} GROUP BY program ORDER BY program''', self.conn)
+
+    def get_performance_summary(self, top_n=10):
+        average = self.conn.execute(
+            f"SELECT COALESCE(AVG(assessment_score), 0) FROM {self.source('students')}").fetchone()[0]
+        top = pd.read_sql(f'''SELECT name, program, assessment_score FROM {self.source('students')}
+                          ORDER BY assessment_score DESC LIMIT ?''', self.conn, params=(top_n,))
+        return average, top
+
+    def iter_student_roster(self, chunk_size=5000):
+        return pd.read_sql(f'''SELECT id, name, email, program, payment_status, amount_paid, assessment_score
+                           FROM {self.source('students')} ORDER BY program, name''', self.conn, chunksize=chunk_size)
+
+    def iter_campaigns(self, chunk_size=5000):
+        return pd.read_sql(f'''SELECT platform, campaign_name, start_date, end_date, spend, leads_generated
+                           FROM {self.source('marketing')} ORDER BY start_date''', self.conn, chunksize=chunk_size)
+
+    def generate_report(self, report_type='monthly', include_roster=False, filename=None, include_archived=False):
+        # FPDF and the report templates are only needed once a report is requested
+        from t2r_reports import ReportEngine
+        if include_archived:
+            with self.attach_archive():
+                return ReportEngine(self).render(report_type, filename=filename, include_roster=include_roster)
+        return ReportEngine(self).render(report_type, filename=filename, include_roster=include_roster)
     
     # Student success prediction
     def predict_student_success(self):
@@ -292,8 +674,16 @@ class T2RDatabase:
         if len(students) < 10:
             return pd.DataFrame()  # Not enough data
         
-        # Prepare features
-        features = students[['assessment_score', 'risk_score', 'performance_rating']].copy()
+        # scikit-learn takes around a second to import, so load it on first use
+        from sklearn.ensemble import RandomForestClassifier
+        from sklearn.model_selection import train_test_split
+        
+        # Prepare features, including progression from the performance history
+        progression = self.get_performance_progression().rename(columns={'student_id': 'id'})
+        students = students.merge(progression, on='id', how='left')
+        students[['observations', 'assessment_change']] = students[['observations', 'assessment_change']].fillna(0)
+        features = students[['assessment_score', 'risk_score', 'performance_rating',
+                             'observations', 'assessment_change']].copy()
         
         # Create target (success = high assessment score and performance rating)
         students['success'] = ((students['assessment_score'] >= 80) & 
@@ -311,15 +701,166 @@ class T2RDatabase:
         students['success_prediction'] = model.predict_proba(features)[:, 1]
         return students[['name', 'email', 'success_prediction']].sort_values('success_prediction', ascending=False)
     
+    # Archival
+    @contextmanager
+    def attach_archive(self, writable=False):
+        """Attach the compressed archive as schema `archive` for the duration of the block.
+
+        The gzip file is expanded to a scratch database on attach; when
+        `writable` it is recompressed and synced to disk before the block exits.
+        Other threads sharing this connection wait until it is detached.
+        """
+        with self.archive_lock:
+            if self.archive_attached:
+                # Writes inside a read-only attachment would be thrown away on detach
+                if writable and not self.archive_writable:
+                    raise RuntimeError("The archive is attached read-only; detach it before writing to it")
+                yield self
+                return
+
+            fd, scratch = tempfile.mkstemp(suffix='.db')
+            os.close(fd)
+            try:
+                with ARCHIVE_LOCK:
+                    if os.path.exists(self.archive_path):
+                        with gzip.open(self.archive_path, 'rb') as src, open(scratch, 'wb') as dst:
+                            shutil.copyfileobj(src, dst)
+
+                self.conn.commit()
+                self.conn.execute("ATTACH DATABASE ? AS archive", (scratch,))
+                self.archive_attached, self.archive_writable = True, writable
+                try:
+                    self.sync_archive_schema()
+                    yield self
+                    self.conn.commit()
+                finally:
+                    self.conn.rollback()
+                    self.conn.execute("DETACH DATABASE archive")
+                    self.archive_attached = self.archive_writable = False
+                if writable:
+                    with ARCHIVE_LOCK:
+                        self.write_archive(scratch)
+            finally:
+                os.remove(scratch)
+
+    def write_archive(self, scratch):
+        """Compress `scratch` over the archive file. The new file is fsynced
+        before it replaces the old one, and the directory after the rename."""
+        partial = self.archive_path + '.tmp'
+        with open(partial, 'wb') as raw:
+            with open(scratch, 'rb') as src, gzip.GzipFile(fileobj=raw, mode='wb') as dst:
+                shutil.copyfileobj(src, dst)
+            raw.flush()
+            os.fsync(raw.fileno())
+        os.replace(partial, self.archive_path)
+        if hasattr(os, 'O_DIRECTORY'):
+            directory = os.open(os.path.dirname(os.path.abspath(self.archive_path)), os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(directory)
+            finally:
+                os.close(directory)
+
+    def sync_archive_schema(self):
+        """Mirror the archived tables' columns, including ones added after the archive was created"""
+        for table in ARCHIVE_TABLES:
+            self.conn.execute(f"CREATE TABLE IF NOT EXISTS archive.{table} AS SELECT * FROM main.{table} WHERE 0")
+            archived = set(self.table_columns(table, 'archive'))
+            for col in self.conn.execute(f"PRAGMA main.table_info({table})").fetchall():
+                if col[1] not in archived:
+                    self.conn.execute(f"ALTER TABLE archive.{table} ADD COLUMN {col[1]} {col[2]}")
+            # Archived rows keep their ids, so a row archived twice replaces its earlier copy
+            self.conn.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS archive.idx_archive_{table}_id ON {table} (id)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS archive.idx_archive_payments_student ON payments (student_id)")
+        self.conn.commit()
+
+    def archive_inactive_records(self, inactive_days=730, vacuum=True):
+        """Move inactive students (with their payments and history), ended campaigns
+        and old tombstones into the archive. Returns the number of rows moved per table.
+
+        Rows are copied and the archive file synced to disk before they are
+        deleted here, so an interrupted run leaves them in both places (the
+        next run replaces the archived copies) and never in neither. A staged
+        row whose id is archived for a different record raises RuntimeError.
+        """
+        cutoff = (datetime.now() - timedelta(days=inactive_days)).strftime('%Y-%m-%d')
+        selections = {
+            'students': '''(deleted_at IS NOT NULL AND deleted_at < :cutoff)
+                           OR (join_date < :cutoff
+                               AND NOT EXISTS (SELECT 1 FROM main.payments p
+                                               WHERE p.student_id = students.id AND p.payment_date >= :cutoff)
+                               AND NOT EXISTS (SELECT 1 FROM main.performance_history h
+                                               WHERE h.student_id = students.id AND h.recorded_at >= :cutoff))''',
+            'payments': '''student_id IN (SELECT id FROM temp.archive_students)
+                           OR (deleted_at IS NOT NULL AND deleted_at < :cutoff)''',
+            'performance_history': "student_id IN (SELECT id FROM temp.archive_students)",
+            'marketing': "end_date < :cutoff OR (deleted_at IS NOT NULL AND deleted_at < :cutoff)",
+        }
+        moved = {}
+        # Same lock order as attach_archive: this connection first, then the archive file
+        with self.archive_lock, ARCHIVE_LOCK:
+            # An outer attachment would only write the archive after our deletes
+            if self.archive_attached:
+                raise RuntimeError("Detach the archive before archiving records")
+            with self.attach_archive(writable=True):
+                with self.conn:
+                    for table, where in selections.items():
+                        self.conn.execute(f"DROP TABLE IF EXISTS temp.archive_{table}")
+                        self.conn.execute(f'''CREATE TEMP TABLE archive_{table} AS
+                                          SELECT id FROM main.{table} WHERE {where}''', {'cutoff': cutoff})
+                        self.check_archive_conflicts(table)
+                        columns = ', '.join(self.table_columns(table))
+                        self.conn.execute(f'''INSERT OR REPLACE INTO archive.{table} ({columns})
+                                          SELECT {columns} FROM main.{table}
+                                          WHERE id IN (SELECT id FROM temp.archive_{table})''')
+
+            # The archive is safely on disk; only now do the staged rows leave the main database
+            with self.conn:
+                for table in selections:
+                    moved[table] = self.conn.execute(f'''DELETE FROM main.{table}
+                                                     WHERE id IN (SELECT id FROM temp.archive_{table})''').rowcount
+                    self.conn.execute(f"DROP TABLE temp.archive_{table}")
+
+        if vacuum and any(moved.values()):
+            self.conn.execute("VACUUM")
+        self.log_audit("System", f"Archived records older than {cutoff}: {moved}")
+        return moved
+
+    def check_archive_conflicts(self, table):
+        """Refuse to archive staged rows whose ids already belong to other archived records"""
+        differs = ' OR '.join(f"a.{col} IS NOT m.{col}" for col in ARCHIVE_IDENTITY[table])
+        conflicts = [row[0] for row in self.conn.execute(f'''SELECT m.id FROM main.{table} m
+                                                         JOIN archive.{table} a ON a.id = m.id
+                                                         WHERE m.id IN (SELECT id FROM temp.archive_{table})
+                                                         AND ({differs}) LIMIT 10''')]
+        if conflicts:
+            raise RuntimeError(f"Archived {table} already use ids {conflicts} for different records; "
+                               f"refusing to overwrite them")
+
+    def rotate_archive(self):
+        """Set the archive file aside under a timestamped name. Returns the new path, or None."""
+        with self.archive_lock, ARCHIVE_LOCK:
+            if self.archive_attached:
+                raise RuntimeError("Detach the archive before rotating it")
+            if not os.path.exists(self.archive_path):
+                return None
+            base = self.archive_path[:-len('.db.gz')] if self.archive_path.endswith('.db.gz') else self.archive_path
+            rotated = f"{base}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.db.gz"
+            os.replace(self.archive_path, rotated)
+            return rotated
+
     # Database management
     def reset_database(self):
+        # Ids start over after the reset, so they must not meet the old archive
+        rotated = self.rotate_archive()
         self.conn.execute("DROP TABLE IF EXISTS students")
         self.conn.execute("DROP TABLE IF EXISTS marketing")
         self.conn.execute("DROP TABLE IF EXISTS payments")
+        self.conn.execute("DROP TABLE IF EXISTS performance_history")
         self.conn.execute("DROP TABLE IF EXISTS audit_log")
         self.create_tables()
         self.initialize_performance_columns()
-        self.log_audit("System", "Database reset")
+        self.initialize_tombstone_columns()
+        self.log_audit("System", f"Database reset (archive moved to {rotated})" if rotated else "Database reset")
     
     def backup_database(self):
         backup_file = f"t2r_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.db"
@@ -335,4 +876,4 @@ class T2RDatabase:
             sql = f.read()
             self.conn.executescript(sql)
         self.conn.commit()
-        self.log_audit("System", f"Restored from backup: {backup_file}")
\ No newline at end of file
+        self.log_audit("System", f"Restored from backup: {backup_file}")
@@ -0,0 +1,332 @@
+import io
+import os
+import re
+from datetime import datetime
+
+import pandas as pd
+
+# Statement exports name the same fields differently (bank CSV, PayPal, exchanges)
+COLUMN_ALIASES = {
+    'transaction_id': ['transaction_id', 'transaction', 'txn_id', 'reference', 'fitid', 'id'],
+    'amount': ['amount', 'gross', 'trnamt', 'value', 'net'],
+    'payment_date': ['payment_date', 'date', 'transaction_date', 'posted', 'dtposted'],
+    'email': ['email', 'from_email_address', 'payer_email'],
+    'student_id': ['student_id'],
+}
+
+OFX_TAG = re.compile(r'<(/?)(\w+)>([^<\r\n]*)')
+
+
+def normalize_statement(frame):
+    """Map a raw statement chunk onto the COLUMN_ALIASES fields"""
+    frame = frame.rename(columns=lambda c: str(c).strip().lower().replace(' ', '_'))
+    if not any(alias in frame.columns for alias in COLUMN_ALIASES['amount']):
+        raise ValueError(f"Statement has no amount column (expected one of: "
+                         f"{', '.join(COLUMN_ALIASES['amount'])}); found: {', '.join(frame.columns)}")
+    normalized = pd.DataFrame(index=frame.index)
+    for column, aliases in COLUMN_ALIASES.items():
+        found = next((alias for alias in aliases if alias in frame.columns), None)
+        normalized[column] = frame[found] if found else None
+
+    normalized['transaction_id'] = normalized['transaction_id'].fillna('').astype(str).str.strip()
+    amounts = normalized['amount'].astype(str).str.replace(r'[,$\s]', '', regex=True)
+    normalized['amount'] = pd.to_numeric(amounts, errors='coerce')
+    normalized['payment_date'] = pd.to_datetime(normalized['payment_date'], errors='coerce').dt.strftime('%Y-%m-%d')
+    normalized['email'] = normalized['email'].where(normalized['email'].notna(), None)
+    normalized['student_id'] = pd.to_numeric(normalized['student_id'], errors='coerce')
+    return normalized.dropna(subset=['amount'])
+
+
+def read_csv_statement(source, chunk_size=50000):
+    for chunk in pd.read_csv(source, chunksize=chunk_size, dtype=str):
+        yield normalize_statement(chunk)
+
+
+def read_ofx_statement(source, chunk_size=50000):
+    """Stream <STMTTRN> records from an OFX file (SGML or XML flavour)"""
+    if isinstance(source, (str, os.PathLike)):
+        handle = open(source, 'r', encoding='latin-1')
+    elif isinstance(source, io.TextIOBase):
+        handle = source
+    else:
+        handle = io.TextIOWrapper(source, encoding='latin-1')
+
+    rows = []
+    current = None
+    with handle:
+        for line in handle:
+            for closing, tag, value in OFX_TAG.findall(line):
+                tag = tag.upper()
+                if tag == 'STMTTRN':
+                    if closing and current is not None:
+                        rows.append(current)
+                        current = None
+                    elif not closing:
+                        current = {}
+                elif current is not None and not closing and value.strip():
+                    current[tag.lower()] = value.strip()
+            if len(rows) >= chunk_size:
+                yield normalize_statement(ofx_frame(rows))
+                rows = []
+    if rows:
+        yield normalize_statement(ofx_frame(rows))
+
+
+def ofx_frame(rows):
+    frame = pd.DataFrame(rows)
+    if 'dtposted' in frame.columns:
+        # DTPOSTED looks like 20240131120000[-5:EST]; the day is all we match on
+        frame['dtposted'] = pd.to_datetime(frame['dtposted'].str[:8], format='%Y%m%d', errors='coerce')
+    return frame
+
+
+def read_statement(source, fmt=None, chunk_size=50000):
+    if fmt is None:
+        name = source if isinstance(source, (str, os.PathLike)) else getattr(source, 'name', '')
+        fmt = 'ofx' if str(name).lower().endswith(('.ofx', '.qfx')) else 'csv'
+    if fmt == 'ofx':
+        return read_ofx_statement(source, chunk_size)
+    if fmt == 'csv':
+        return read_csv_statement(source, chunk_size)
+    raise ValueError(f"Unsupported statement format: {fmt}")
+
+
+def to_days(dates):
+    """Day numbers for ISO date strings, -1 where the date is missing or invalid"""
+    days = pd.to_datetime(dates, errors='coerce')
+    return (days - pd.Timestamp(0)).dt.days.fillna(-1).astype('int64')
+
+
+def pair_within(lines, payments, keys, tolerance):
+    """Pair statement lines with payments that share `keys` and are at most
+    `tolerance` days apart, one-to-one.
+
+    Both sides are sorted by key then day and walked with two pointers, so a
+    block of identical amounts (program prices, say) costs one pass instead of
+    a cross product. On sorted points this greedy pairs as many as possible.
+    """
+    lines = lines[lines['day'] >= 0].sort_values(keys + ['day', 'line_no'])
+    payments = payments[payments['day'] >= 0].sort_values(keys + ['day', 'payment_id'])
+    line_keys = list(zip(*(lines[key].astype('int64') for key in keys)))
+    payment_keys = list(zip(*(payments[key].astype('int64') for key in keys)))
+    line_days, payment_days = lines['day'].tolist(), payments['day'].tolist()
+
+    line_rows, payment_rows = [], []
+    i = j = 0
+    while i < len(line_keys) and j < len(payment_keys):
+        if line_keys[i] < payment_keys[j]:
+            i += 1
+        elif line_keys[i] > payment_keys[j] or line_days[i] - payment_days[j] > tolerance:
+            j += 1
+        elif payment_days[j] - line_days[i] > tolerance:
+            i += 1
+        else:
+            line_rows.append(i)
+            payment_rows.append(j)
+            i += 1
+            j += 1
+
+    line_part = lines.iloc[line_rows].drop(columns=['day', 'amount_cents', 'student_id'], errors='ignore')
+    payment_part = payments.iloc[payment_rows].drop(columns=['day', 'amount_cents'])
+    return pd.concat([line_part.reset_index(drop=True), payment_part.reset_index(drop=True)], axis=1)
+
+
+class ReconciliationResult:
+    def __init__(self, lines, corrections=0):
+        self.lines = lines
+        self.corrections = corrections
+
+    @property
+    def summary(self):
+        return self.lines['status'].value_counts().to_dict()
+
+    @property
+    def flagged(self):
+        return self.lines[self.lines['status'] != 'matched']
+
+    @property
+    def affected_students(self):
+        return sorted(self.flagged['student_id'].dropna().astype(int).unique().tolist())
+
+
+class PaymentReconciler:
+    """Match an external statement against the payments table.
+
+    Lines are streamed into a temp table and matched on transaction id through
+    the payments index. Whatever is left is paired on amount within the date
+    tolerance (and student, when the statement identifies one).
+    `method` is the statement's payment channel: only payments recorded with
+    it take part in fuzzy matching, and corrections are recorded with it.
+    Statuses: matched, amount_mismatch, student_mismatch, fuzzy_match,
+    deleted_payment, duplicate_statement_line, duplicate_payment,
+    missing_in_db and missing_in_statement.
+    """
+
+    def __init__(self, db, date_tolerance_days=3, method="Bank Transfer"):
+        self.db = db
+        self.conn = db.conn
+        self.date_tolerance_days = date_tolerance_days
+        self.method = method
+
+    def reconcile(self, source, fmt=None, apply_corrections=False, chunk_size=50000):
+        try:
+            self.load_statement(read_statement(source, fmt, chunk_size))
+            lines = self.match()
+            corrections, corrected_students = self.apply(lines) if apply_corrections else (0, [])
+        finally:
+            self.conn.execute("DROP TABLE IF EXISTS temp.statement_lines")
+
+        result = ReconciliationResult(lines, corrections)
+        # A dry run leaves balances alone: students may carry amounts with no payment rows behind them
+        if corrected_students:
+            self.db.recalculate_payment_status(corrected_students)
+        self.db.log_audit("System", f"Reconciled statement: {result.summary}, {corrections} corrections applied")
+        return result
+
+    def load_statement(self, chunks):
+        self.conn.execute("DROP TABLE IF EXISTS temp.statement_lines")
+        self.conn.execute('''CREATE TEMP TABLE statement_lines (
+            line_no INTEGER PRIMARY KEY,
+            transaction_id TEXT,
+            amount REAL,
+            amount_cents INTEGER,
+            payment_date DATE,
+            email TEXT,
+            student_id INTEGER
+        )''')
+        line_no = 0
+        for chunk in chunks:
+            chunk = chunk.copy()
+            chunk.insert(0, 'line_no', range(line_no + 1, line_no + len(chunk) + 1))
+            chunk['amount_cents'] = (chunk['amount'] * 100).round().astype('int64')
+            rows = chunk[['line_no', 'transaction_id', 'amount', 'amount_cents', 'payment_date',
+                          'email', 'student_id']].astype(object)
+            rows = rows.where(rows.notna(), None)
+            self.conn.executemany('INSERT INTO statement_lines VALUES (?, ?, ?, ?, ?, ?, ?)',
+                                  rows.itertuples(index=False, name=None))
+            line_no += len(chunk)
+
+        # Resolve payer emails to live students through the unique email index
+        self.conn.execute('''UPDATE statement_lines SET student_id = (
+                                 SELECT id FROM students
+                                 WHERE students.email = statement_lines.email AND students.deleted_at IS NULL)
+                             WHERE student_id IS NULL AND email IS NOT NULL''')
+        self.conn.execute("CREATE INDEX temp.idx_statement_transaction ON statement_lines (transaction_id)")
+
+    def match(self):
+        columns = ['status', 'line_no', 'transaction_id', 'statement_amount', 'statement_date',
+                   'payment_id', 'student_id', 'payment_amount', 'payment_date']
+
+        duplicate_lines = pd.read_sql('''SELECT 'duplicate_statement_line' AS status, line_no, transaction_id,
+                                      amount AS statement_amount, payment_date AS statement_date,
+                                      student_id
+                                      FROM (SELECT *, ROW_NUMBER() OVER (
+                                                PARTITION BY transaction_id ORDER BY line_no) AS rn
+                                            FROM statement_lines WHERE transaction_id <> '')
+                                      WHERE rn > 1''', self.conn)
+        duplicate_payments = pd.read_sql('''SELECT 'duplicate_payment' AS status, transaction_id,
+                                         id AS payment_id, student_id, amount AS payment_amount, payment_date
+                                         FROM (SELECT *, ROW_NUMBER() OVER (
+                                                   PARTITION BY transaction_id ORDER BY id) AS rn
+                                               FROM payments WHERE transaction_id <> '' AND deleted_at IS NULL)
+                                         WHERE rn > 1''', self.conn)
+
+        # Indexed lookup of first statement occurrences against canonical payments
+        exact = pd.read_sql('''SELECT s.line_no, s.transaction_id, s.amount AS statement_amount,
+                            s.payment_date AS statement_date, s.student_id AS statement_student,
+                            p.id AS payment_id, p.student_id, p.amount AS payment_amount, p.payment_date,
+                            p.deleted_at
+                            FROM statement_lines s
+                            JOIN payments p ON p.transaction_id = s.transaction_id
+                            WHERE s.transaction_id <> '' AND p.transaction_id <> ''
+                            AND s.line_no = (SELECT MIN(line_no) FROM statement_lines d
+                                             WHERE d.transaction_id = s.transaction_id)
+                            AND p.id = (SELECT id FROM payments d
+                                        WHERE d.transaction_id = p.transaction_id AND d.transaction_id <> ''
+                                        ORDER BY d.deleted_at IS NOT NULL, d.id LIMIT 1)''', self.conn)
+        exact['status'] = 'matched'
+        exact.loc[exact['statement_student'].notna()
+                  & (exact['statement_student'] != exact['student_id']), 'status'] = 'student_mismatch'
+        exact.loc[(exact['statement_amount'] - exact['payment_amount']).abs() >= 0.005, 'status'] = 'amount_mismatch'
+        # The statement still carries a payment that was soft-deleted here
+        exact.loc[exact['deleted_at'].notna(), 'status'] = 'deleted_payment'
+
+        fuzzy, missing_in_db, missing_in_statement = self.match_residual(
+            set(exact['line_no']) | set(duplicate_lines['line_no']),
+            set(exact['payment_id']) | set(duplicate_payments['payment_id']))
+
+        frames = [exact, fuzzy, duplicate_lines, duplicate_payments, missing_in_db, missing_in_statement]
+        frames = [frame.reindex(columns=columns) for frame in frames if not frame.empty]
+        # An empty statement with no payments in range leaves nothing to report
+        lines = (pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()).reindex(columns=columns)
+        for column in ['line_no', 'payment_id', 'student_id']:
+            lines[column] = pd.to_numeric(lines[column]).astype('Int64')
+        return lines
+
+    def match_residual(self, matched_lines, matched_payments):
+        statement = pd.read_sql('''SELECT line_no, transaction_id, amount AS statement_amount, amount_cents,
+                                payment_date AS statement_date, student_id AS statement_student
+                                FROM statement_lines''', self.conn)
+        statement = statement[~statement['line_no'].isin(matched_lines)]
+
+        bounds = self.conn.execute('''SELECT date(MIN(payment_date), ?), date(MAX(payment_date), ?)
+                                   FROM statement_lines''',
+                                   (f"-{self.date_tolerance_days} days",
+                                    f"+{self.date_tolerance_days} days")).fetchone()
+        # Only this statement's channel can be missing from it
+        payments = pd.read_sql('''SELECT id AS payment_id, student_id, amount AS payment_amount,
+                               payment_date, transaction_id AS payment_transaction
+                               FROM payments WHERE payment_date BETWEEN ? AND ? AND deleted_at IS NULL
+                               AND method = ?''',
+                               self.conn, params=(*bounds, self.method))
+        payments = payments[~payments['payment_id'].isin(matched_payments)]
+        payments = payments.assign(amount_cents=(payments['payment_amount'] * 100).round().astype('int64'),
+                                   day=to_days(payments['payment_date']))
+        statement = statement.assign(day=to_days(statement['statement_date']))
+
+        # Lines naming a student only pair with that student's payments; the rest
+        # pair on amount alone with whatever is left
+        named = statement['statement_student'].notna()
+        by_student = pair_within(statement[named].assign(student_id=statement['statement_student']),
+                                 payments, ['amount_cents', 'student_id'], self.date_tolerance_days)
+        by_amount = pair_within(statement[~named], payments[~payments['payment_id'].isin(by_student['payment_id'])],
+                                ['amount_cents'], self.date_tolerance_days)
+        fuzzy = pd.concat([by_student, by_amount], ignore_index=True).assign(status='fuzzy_match')
+        taken_lines, taken_payments = set(fuzzy['line_no']), set(fuzzy['payment_id'])
+
+        missing_in_db = statement[~statement['line_no'].isin(taken_lines)]
+        missing_in_db = missing_in_db.assign(status='missing_in_db', student_id=missing_in_db['statement_student'])
+        missing_in_statement = payments[~payments['payment_id'].isin(taken_payments)]
+        missing_in_statement = missing_in_statement.assign(
+            status='missing_in_statement', transaction_id=missing_in_statement['payment_transaction'])
+        return fuzzy, missing_in_db, missing_in_statement
+
+    def apply(self, lines):
+        """Adopt statement amounts, backfill transaction ids and add payments
+        that are on the statement for a known student but missing here.
+        Returns the number of corrections and the students whose payments changed."""
+        mismatched = lines[lines['status'] == 'amount_mismatch']
+        self.conn.executemany("UPDATE payments SET amount = ? WHERE id = ?",
+                              zip(mismatched['statement_amount'], mismatched['payment_id'].astype(int)))
+
+        backfill = lines[(lines['status'] == 'fuzzy_match') & (lines['transaction_id'] != '')]
+        self.conn.executemany("UPDATE payments SET transaction_id = ? WHERE id = ? AND transaction_id = ''",
+                              zip(backfill['transaction_id'], backfill['payment_id'].astype(int)))
+
+        # Deleted students stay deleted: their statement lines are only reported
+        missing = lines[(lines['status'] == 'missing_in_db') & lines['student_id'].notna()]
+        if not missing.empty:
+            active = pd.read_sql("SELECT id FROM students WHERE deleted_at IS NULL", self.conn)['id']
+            missing = missing[missing['student_id'].isin(active)]
+        self.conn.executemany('''INSERT INTO payments (student_id, amount, payment_date, method, transaction_id)
+                              VALUES (?, ?, ?, ?, ?)''',
+                              ((int(row.student_id), row.statement_amount,
+                                row.statement_date if pd.notna(row.statement_date)
+                                else datetime.now().strftime('%Y-%m-%d'),
+                                self.method, row.transaction_id)
+                               for row in missing.itertuples()))
+        self.conn.commit()
+
+        # Backfilled ids don't move money, so only these balances need recomputing
+        students = pd.concat([mismatched['student_id'], missing['student_id']]).dropna().astype(int)
+        return len(mismatched) + len(backfill) + len(missing), sorted(students.unique().tolist())
@@ -0,0 +1,264 @@
+import os
+import tempfile
+from abc import ABC, abstractmethod
+from datetime import datetime
+
+from fpdf import FPDF
+
+from t2r_charts import roi_chart, program_distribution_chart
+
+
+def to_latin1(series):
+    # FPDF core fonts only cover latin-1
+    return series.astype(str).str.encode('latin-1', 'replace').str.decode('latin-1')
+
+
+def to_latin1_text(text):
+    return text.encode('latin-1', 'replace').decode('latin-1')
+
+
+class ReportPDF(FPDF):
+    """FPDF document that repeats the active table header on every page"""
+
+    def __init__(self, title):
+        super().__init__()
+        self.report_title = title
+        self.table_header = None
+        self.set_auto_page_break(True, margin=15)
+        self.alias_nb_pages()
+
+    def header(self):
+        self.set_font("Arial", 'I', 8)
+        self.cell(0, 6, txt=self.report_title, ln=True, align='R')
+        if self.table_header:
+            self.set_font("Courier", 'B', 7)
+            self.cell(0, 4, txt=self.table_header, ln=True)
+            self.set_font("Courier", size=7)
+
+    def footer(self):
+        self.set_y(-12)
+        self.set_font("Arial", 'I', 8)
+        self.cell(0, 6, txt=f"Page {self.page_no()}/{{nb}}", align='C')
+
+    def section_title(self, title):
+        self.set_font("Arial", 'B', 12)
+        self.cell(0, 10, txt=title, ln=True)
+        self.set_font("Arial", size=10)
+
+    def lines(self, lines, height=7):
+        for line in lines:
+            self.cell(0, height, txt=line, ln=True)
+
+    def chart(self, fig, width=180):
+        # Charts are exported offline through kaleido (pinned in requirements.txt);
+        # plotly raises ValueError when kaleido is missing or the export fails
+        try:
+            image = fig.to_image(format='png', width=900, height=450)
+        except (ValueError, RuntimeError) as e:
+            reason = str(e).strip().split('\n')[0] or type(e).__name__
+            self.set_font("Arial", 'I', 9)
+            self.multi_cell(0, 5, txt=f"Chart unavailable: {to_latin1_text(reason)}")
+            self.set_font("Arial", size=10)
+            return
+
+        fd, path = tempfile.mkstemp(suffix='.png')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(image)
+            self.image(path, w=width)
+        finally:
+            os.remove(path)
+
+
+class ReportSection(ABC):
+    """A reusable block of a report: `load` pulls pre-aggregated data, `render` writes it"""
+    title = ""
+
+    def __init__(self, title=None):
+        if title:
+            self.title = title
+
+    def load(self, db):
+        return None
+
+    @abstractmethod
+    def render(self, pdf, data):
+        pass
+
+    def write(self, pdf, db):
+        pdf.section_title(self.title)
+        self.render(pdf, self.load(db))
+        pdf.ln(5)
+
+
+class FinancialSection(ReportSection):
+    title = "Financial Summary"
+
+    def load(self, db):
+        return db.get_financial_summary()
+
+    def render(self, pdf, data):
+        pdf.lines([
+            f"Total Revenue: ${data['revenue']:,.2f}",
+            f"Marketing Spend: ${data['spend']:,.2f}",
+            f"Net Profit: ${data['revenue'] - data['spend']:,.2f}",
+            f"Students: {data['students']:,}",
+        ])
+
+
+class ProgramSection(ReportSection):
+    title = "Program Performance"
+
+    def load(self, db):
+        return db.get_program_summary()
+
+    def render(self, pdf, data):
+        if data.empty:
+            pdf.lines(["No student data available"])
+            return
+        lines = (data['program'].astype(str) + ": $" + data['revenue'].map('{:,.2f}'.format)
+                 + " from " + data['students'].astype(str) + " students")
+        pdf.lines(to_latin1(lines))
+        counts = data.set_index('program')['students']
+        pdf.chart(program_distribution_chart(counts))
+
+
+class CampaignSection(ReportSection):
+    title = "Marketing Performance"
+
+    def load(self, db):
+        return db.calculate_roi()
+
+    def render(self, pdf, data):
+        if data.empty:
+            pdf.lines(["No marketing data available"])
+            return
+        lines = (data['source'].astype(str) + ": ROI " + data['roi'].map('{:.1f}%'.format)
+                 + " (revenue $" + data['revenue'].map('{:,.2f}'.format)
+                 + ", spend $" + data['spend'].map('{:,.2f}'.format) + ")")
+        pdf.lines(to_latin1(lines))
+        pdf.chart(roi_chart(data))
+
+
+class PerformanceSection(ReportSection):
+    title = "Student Performance"
+
+    def __init__(self, title=None, top_n=10):
+        super().__init__(title)
+        self.top_n = top_n
+
+    def load(self, db):
+        return db.get_performance_summary(self.top_n)
+
+    def render(self, pdf, data):
+        average, top = data
+        pdf.lines([f"Average Assessment Score: {average:.1f}/100", "Top Performers:"])
+        lines = (top['name'].astype(str) + " - " + top['program'].astype(str)
+                 + " (" + top['assessment_score'].astype(str) + "/100)")
+        pdf.lines(to_latin1(lines))
+
+
+class TableSection(ReportSection):
+    """Fixed-width table rendered from chunks of a pre-aggregated query.
+
+    Each row is formatted into a single line with vectorized string ops and
+    emitted as one cell, so pages are produced without per-field layout work
+    and only one chunk is held in memory at a time.
+    """
+    columns = []  # (column, heading, width, formatter)
+
+    def __init__(self, title=None, chunk_size=5000):
+        super().__init__(title)
+        self.chunk_size = chunk_size
+
+    def format_chunk(self, chunk):
+        parts = []
+        for column, _, width, formatter in self.columns:
+            if formatter:
+                values = chunk[column].fillna(0).map(formatter)
+            else:
+                values = chunk[column].fillna('').astype(str)
+            values = to_latin1(values).str.slice(0, width)
+            parts.append(values.str.rjust(width) if formatter else values.str.ljust(width))
+        return parts[0].str.cat(parts[1:], sep=' ')
+
+    def render(self, pdf, chunks):
+        header = ' '.join(heading.ljust(width)[:width] for _, heading, width, _ in self.columns)
+        pdf.table_header = header
+        pdf.set_font("Courier", 'B', 7)
+        pdf.cell(0, 4, txt=header, ln=True)
+        pdf.set_font("Courier", size=7)
+        rows = 0
+        for chunk in chunks:
+            pdf.lines(self.format_chunk(chunk), height=4)
+            rows += len(chunk)
+        pdf.table_header = None
+        pdf.set_font("Arial", size=10)
+        pdf.lines([f"{rows:,} rows"])
+
+
+class RosterSection(TableSection):
+    title = "Student Roster"
+    columns = [
+        ('id', 'ID', 7, None),
+        ('name', 'Name', 28, None),
+        ('email', 'Email', 34, None),
+        ('program', 'Program', 8, None),
+        ('payment_status', 'Status', 7, None),
+        ('amount_paid', 'Paid', 11, '{:,.2f}'.format),
+        ('assessment_score', 'Score', 5, '{:.0f}'.format),
+    ]
+
+    def load(self, db):
+        return db.iter_student_roster(self.chunk_size)
+
+
+class CampaignTableSection(TableSection):
+    title = "Campaign Details"
+    columns = [
+        ('platform', 'Platform', 11, None),
+        ('campaign_name', 'Campaign', 30, None),
+        ('start_date', 'Start', 10, None),
+        ('end_date', 'End', 10, None),
+        ('spend', 'Spend', 12, '{:,.2f}'.format),
+        ('leads_generated', 'Leads', 7, '{:,.0f}'.format),
+    ]
+
+    def load(self, db):
+        return db.iter_campaigns(self.chunk_size)
+
+
+REPORT_TEMPLATES = {
+    'monthly': [FinancialSection, ProgramSection, CampaignSection, PerformanceSection],
+    'quarterly': [FinancialSection, ProgramSection, CampaignSection, CampaignTableSection, PerformanceSection],
+    'custom': [FinancialSection, ProgramSection, CampaignSection, PerformanceSection],
+    'roster': [FinancialSection, ProgramSection, RosterSection],
+}
+
+
+class ReportEngine:
+    def __init__(self, db):
+        self.db = db
+
+    def render(self, report_type='monthly', sections=None, filename=None, include_roster=False):
+        if sections is None:
+            sections = [section() for section in REPORT_TEMPLATES.get(report_type, REPORT_TEMPLATES['monthly'])]
+        if include_roster and not any(isinstance(section, RosterSection) for section in sections):
+            sections = sections + [RosterSection()]
+        if filename is None:
+            filename = f"T2R_Report_{datetime.now().strftime('%Y%m%d')}.pdf"
+
+        title = f"Trade2Retire Academy {report_type.capitalize()} Report"
+        pdf = ReportPDF(title)
+        pdf.add_page()
+        pdf.set_font("Arial", 'B', 14)
+        pdf.cell(0, 10, txt=title, ln=True, align='C')
+        pdf.set_font("Arial", size=10)
+        pdf.cell(0, 6, txt=f"Generated {datetime.now().strftime('%Y-%m-%d %H:%M')}", ln=True, align='C')
+        pdf.ln(6)
+
+        for section in sections:
+            section.write(pdf, self.db)
+
+        pdf.output(filename)
+        return filename
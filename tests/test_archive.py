@@ -0,0 +1,109 @@
+import glob
+import gzip
+
+import pytest
+
+
+def add_old_student(db, name, joined='2015-01-01'):
+    sid = db.conn.execute('''INSERT INTO students (name, email, program, join_date, payment_status, amount_paid)
+                          VALUES (?, ?, 'AI', ?, 'Paid', 497)''', (name, f"{name}@example.com", joined)).lastrowid
+    db.conn.execute('''INSERT INTO payments (student_id, amount, payment_date, method)
+                    VALUES (?, 497, ?, 'Bank Transfer')''', (sid, joined))
+    db.conn.commit()
+    return sid
+
+
+def test_archive_round_trip(db, add_students):
+    old = add_old_student(db, 'alumnus')
+    [current] = add_students(1)
+
+    moved = db.archive_inactive_records(inactive_days=365)
+
+    assert moved['students'] == 1 and moved['payments'] == 1
+    assert db.get_students()['id'].tolist() == [current]
+    with gzip.open(db.archive_path) as f:
+        assert f.read(16) == b'SQLite format 3\x00'
+    with db.attach_archive():
+        students = db.conn.execute(f"SELECT id FROM {db.source('students')} ORDER BY id").fetchall()
+        payments = db.conn.execute(f"SELECT student_id, amount FROM {db.source('payments')}").fetchall()
+    assert students == [(old,), (current,)]
+    assert payments == [(old, 497)]
+    assert not db.archive_attached
+
+
+def test_rearchiving_after_interrupted_run_replaces_archived_copy(db):
+    sid = add_old_student(db, 'alumnus')
+    db.archive_inactive_records(inactive_days=365)
+    # A run that stopped after writing the archive leaves the rows in main as well
+    db.conn.execute('''INSERT INTO students (id, name, email, program, join_date)
+                    VALUES (?, 'alumnus', 'alumnus@example.com', 'AI', '2015-01-01')''', (sid,))
+    db.conn.commit()
+
+    assert db.archive_inactive_records(inactive_days=365)['students'] == 1
+    with db.attach_archive():
+        assert db.conn.execute("SELECT COUNT(*) FROM archive.students").fetchone()[0] == 1
+
+
+def test_writable_attach_inside_read_only_attach_is_refused(db):
+    with db.attach_archive():
+        with pytest.raises(RuntimeError):
+            with db.attach_archive(writable=True):
+                pass
+
+
+@pytest.mark.parametrize('writable', [False, True])
+def test_archiving_inside_an_attached_block_is_refused(db, writable):
+    add_old_student(db, 'alumnus')
+
+    with db.attach_archive(writable=writable):
+        with pytest.raises(RuntimeError):
+            db.archive_inactive_records(inactive_days=365)
+
+    assert db.conn.execute("SELECT COUNT(*) FROM students").fetchone()[0] == 1
+
+
+def test_failed_compression_keeps_rows_in_main(db, monkeypatch):
+    add_old_student(db, 'alumnus')
+
+    def fail(scratch):
+        raise OSError("disk full")
+    monkeypatch.setattr(db, 'write_archive', fail)
+
+    with pytest.raises(OSError):
+        db.archive_inactive_records(inactive_days=365)
+
+    assert db.conn.execute("SELECT COUNT(*) FROM students").fetchone()[0] == 1
+    assert db.conn.execute("SELECT COUNT(*) FROM payments").fetchone()[0] == 1
+
+
+def test_reset_sets_the_archive_aside(db):
+    add_old_student(db, 'old')
+    db.archive_inactive_records(inactive_days=365)
+    archived = db.archive_path
+
+    db.reset_database()
+    add_old_student(db, 'new')
+    db.archive_inactive_records(inactive_days=365)
+
+    with db.attach_archive():
+        assert db.conn.execute("SELECT id, name FROM archive.students").fetchall() == [(1, 'new')]
+    [rotated] = glob.glob(archived[:-len('.db.gz')] + '_*.db.gz')
+    with gzip.open(rotated) as f:
+        assert f.read(16) == b'SQLite format 3\x00'
+
+
+def test_archive_refuses_to_overwrite_a_different_record(db):
+    add_old_student(db, 'old')
+    db.archive_inactive_records(inactive_days=365)
+    # Something handed id 1 out again, e.g. a database restored from an old backup
+    db.conn.execute('''INSERT INTO students (id, name, email, program, join_date)
+                    VALUES (1, 'new', 'new@example.com', 'AI', '2015-06-01')''')
+    db.conn.commit()
+
+    with pytest.raises(RuntimeError, match="different records"):
+        db.archive_inactive_records(inactive_days=365)
+
+    assert db.conn.execute("SELECT name FROM students").fetchall() == [('new',)]
+    with db.attach_archive():
+        assert db.conn.execute("SELECT name FROM archive.students").fetchall() == [('old',)]
+
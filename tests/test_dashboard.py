@@ -0,0 +1,26 @@
+import os
+
+from streamlit.testing.v1 import AppTest
+
+DASHBOARD = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'dashboard.py')
+
+
+def run_session():
+    app = AppTest.from_file(DASHBOARD, default_timeout=60)
+    app.session_state['authenticated'] = True
+    app.run()
+    assert not app.exception
+    return app
+
+
+def test_sessions_get_their_own_database(tmp_path, monkeypatch):
+    # The dashboard opens t2r_data.db in the working directory
+    monkeypatch.chdir(tmp_path)
+
+    first, second = run_session(), run_session()
+    db = first.session_state['db']
+    first.run()
+
+    assert first.session_state['db'] is db
+    assert second.session_state['db'] is not db
+    assert second.session_state['db'].conn is not db.conn
@@ -0,0 +1,121 @@
+import sqlite3
+
+import pandas as pd
+import pytest
+
+from t2r_database import T2RDatabase
+
+
+def student_balance(db, student_id):
+    return db.conn.execute("SELECT amount_paid, payment_status FROM students WHERE id = ?",
+                           (student_id,)).fetchone()
+
+
+def test_recalculate_all_students(db, add_students):
+    paid, partial, unpaid = add_students(3)
+    db.conn.executemany("INSERT INTO payments (student_id, amount, payment_date) VALUES (?, ?, '2024-01-01')",
+                        [(paid, 400), (paid, 97), (partial, 100)])
+    db.conn.execute("UPDATE students SET amount_paid = 999, payment_status = 'Paid' WHERE id = ?", (unpaid,))
+
+    db.recalculate_payment_status()
+
+    assert student_balance(db, paid) == (497, 'Paid')
+    assert student_balance(db, partial) == (100, 'Partial')
+    assert student_balance(db, unpaid) == (0, 'Unpaid')
+
+
+def test_deleting_a_payment_recomputes_the_balance(db, add_students):
+    [sid] = add_students(1)
+    db.record_payment(sid, 400, transaction_id='TX1')
+    db.record_payment(sid, 97)
+    assert student_balance(db, sid) == (497, 'Paid')
+
+    payment_id = db.conn.execute("SELECT id FROM payments WHERE transaction_id = 'TX1'").fetchone()[0]
+    db.delete_payment(payment_id)
+
+    assert student_balance(db, sid) == (97, 'Partial')
+    assert db.get_total_paid(sid) == 97
+    assert payment_id not in db.get_payments()['id'].tolist()
+
+
+def test_deleted_student_frees_email_and_transaction_ids(db, add_students):
+    [sid] = add_students(1)
+    db.record_payment(sid, 497, transaction_id='TX1')
+    db.delete_student(sid)
+
+    assert db.get_student(sid) is None
+    db.add_student("again", "s0@example.com", None, 'AI', 'Unpaid', 0, 'Facebook')
+    again = db.conn.execute("SELECT id FROM students WHERE deleted_at IS NULL").fetchone()[0]
+    db.record_payment(again, 497, transaction_id='TX1')
+
+    assert student_balance(db, again) == (497, 'Paid')
+    with pytest.raises(ValueError):
+        db.add_student("third", "s0@example.com", None, 'AI', 'Unpaid', 0, 'Facebook')
+    with pytest.raises(ValueError):
+        db.record_payment(again, 1, transaction_id='TX1')
+
+
+def test_undelete_student_restores_their_payments(db, add_students):
+    [sid] = add_students(1)
+    db.record_payment(sid, 100)
+    db.record_payment(sid, 200)
+    separately_deleted = db.conn.execute("SELECT MIN(id) FROM payments").fetchone()[0]
+    db.delete_payment(separately_deleted)
+    db.conn.execute("UPDATE payments SET deleted_at = '2020-01-01' WHERE id = ?", (separately_deleted,))
+    db.conn.commit()
+    db.delete_student(sid)
+
+    db.undelete_student(sid)
+
+    assert db.get_student(sid)['amount_paid'] == 200
+    assert db.get_payments()['amount'].tolist() == [200]
+
+
+def test_undelete_refuses_clashes(db, add_students):
+    [sid] = add_students(1)
+    db.record_payment(sid, 100, transaction_id='TX1')
+    payment_id = db.conn.execute("SELECT id FROM payments").fetchone()[0]
+    db.delete_payment(payment_id)
+    db.record_payment(sid, 100, transaction_id='TX1')
+
+    with pytest.raises(ValueError):
+        db.undelete_payment(payment_id)
+
+    db.delete_student(sid)
+    db.add_student("again", "s0@example.com", None, 'AI', 'Unpaid', 0, 'Facebook')
+    with pytest.raises(ValueError):
+        db.undelete_student(sid)
+    assert db.get_student(sid) is None
+
+
+def test_history_import_by_email_skips_deleted_students(db, add_students):
+    [old] = add_students(1)
+    db.delete_student(old)
+    db.add_student("again", "s0@example.com", None, 'AI', 'Unpaid', 0, 'Facebook')
+
+    db.import_performance_history(pd.DataFrame([{'email': 's0@example.com', 'recorded_at': '2024-01-01',
+                                                 'assessment_score': 80, 'risk_score': 2,
+                                                 'performance_rating': 4}]))
+
+    history = db.conn.execute("SELECT student_id FROM performance_history").fetchall()
+    assert history == [(old + 1,)]
+
+
+def test_legacy_unique_email_is_rebuilt(tmp_path):
+    path = str(tmp_path / 'legacy.db')
+    conn = sqlite3.connect(path)
+    conn.execute('''CREATE TABLE students (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL,
+                    email TEXT UNIQUE, phone TEXT, program TEXT, join_date DATE, payment_status TEXT,
+                    amount_paid REAL, source TEXT)''')
+    conn.executemany("INSERT INTO students (name, email) VALUES (?, ?)", [('a', 'a@example.com'), ('b', 'b@example.com')])
+    conn.execute("DELETE FROM students WHERE name = 'b'")
+    conn.commit()
+    conn.close()
+
+    db = T2RDatabase(path)
+    db.delete_student(1)
+    db.add_student("a again", "a@example.com", None, 'AI', 'Unpaid', 0, 'Facebook')
+
+    # The rebuild keeps the AUTOINCREMENT high-water mark
+    assert db.conn.execute("SELECT id FROM students WHERE deleted_at IS NULL").fetchall() == [(3,)]
+    db.conn.close()
@@ -0,0 +1,139 @@
+import io
+import sqlite3
+import pandas as pd
+import pytest
+
+
+def history_frame(student_id, points):
+    return pd.DataFrame([
+        {'student_id': student_id, 'recorded_at': recorded_at, 'assessment_score': assessment,
+         'risk_score': risk, 'performance_rating': rating}
+        for recorded_at, assessment, risk, rating in points
+    ])
+
+
+def test_compaction_preserves_weighted_averages_with_missing_metrics(db, add_students):
+    [sid] = add_students(1)
+    db.import_performance_history(history_frame(sid, [
+        ('2020-01-05', 60, 3, 4),
+        ('2020-01-12', 80, None, None),
+        ('2020-01-19', 70, None, 2),
+        ('2020-01-26', 90, 3, None),
+        ('2020-02-02', 50, None, None),
+    ]))
+
+    removed = db.compact_performance_history(older_than_days=30, period='month')
+
+    assert removed == 4
+    history = db.get_performance_history(sid)
+    january = history[history['source'] == 'compacted'].iloc[0]
+    assert january['sample_count'] == 4
+    assert january['assessment_score'] == pytest.approx(75)
+    assert january['risk_score'] == pytest.approx(3)
+    assert january['performance_rating'] == pytest.approx(3)
+
+    # A second pass merges the compacted point with new raw points using the right weights
+    db.import_performance_history(history_frame(sid, [('2020-01-30', 100, None, None)]))
+    db.compact_performance_history(older_than_days=30, period='month')
+    january = db.get_performance_history(sid).iloc[0]
+    assert january['sample_count'] == 5
+    assert january['assessment_score'] == pytest.approx(80)
+    assert january['risk_score'] == pytest.approx(3)
+
+
+def test_rolling_average_ignores_missing_metrics(db, add_students):
+    [sid] = add_students(1)
+    db.import_performance_history(history_frame(sid, [
+        ('2024-01-01', 60, 4, 3),
+        ('2024-01-02', 80, None, 5),
+        ('2024-01-03', 70, 2, None),
+    ]))
+
+    rolling = db.get_performance_rolling_average(window=3, student_id=sid)
+
+    assert rolling['risk_rolling'].tolist() == pytest.approx([4, 4, 3])
+    assert rolling['rating_rolling'].tolist() == pytest.approx([3, 4, 4])
+    assert rolling['assessment_rolling'].iloc[-1] == pytest.approx(70)
+
+
+def test_import_refreshes_snapshot_beyond_sql_variable_limit(db, add_students):
+    db.conn.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 50)
+    ids = add_students(120)
+    records = pd.DataFrame({'student_id': ids, 'recorded_at': '2024-03-01',
+                            'assessment_score': 88, 'risk_score': 2, 'performance_rating': 5})
+
+    assert db.import_performance_history(records) == 120
+
+    students = db.get_students()
+    assert (students['assessment_score'] == 88).all()
+    assert (students['performance_rating'] == 5).all()
+
+
+def test_failed_import_leaves_no_partial_batch(db, add_students):
+    [sid] = add_students(1)
+    records = history_frame(sid, [('2024-01-01', 60, 3, 3), ('2024-01-02', 70, 3, 3),
+                                  ('not a date', 80, 3, 3)])
+
+    with pytest.raises(ValueError):
+        db.import_performance_history(records, chunk_size=2)
+    db.conn.commit()
+
+    assert db.get_performance_history(sid).empty
+
+
+def test_history_queries_skip_deleted_students(db, add_students):
+    kept, deleted = add_students(2)
+    for sid in (kept, deleted):
+        db.import_performance_history(history_frame(sid, [('2024-01-01', 50, 3, 3), ('2024-02-01', 70, 3, 3)]))
+
+    db.delete_student(deleted)
+
+    assert db.get_latest_performance()['student_id'].tolist() == [kept]
+    assert db.get_performance_progression()['student_id'].tolist() == [kept]
+    assert set(db.get_performance_rolling_average()['student_id']) == {kept}
+    assert db.get_performance_history(deleted).empty
+
+
+def test_program_trend_spans_gaps_and_missing_scores(db, add_students):
+    [ai] = add_students(1, program='AI')
+    [vip] = add_students(1, program='VIP')
+    db.import_performance_history(pd.concat([
+        # Monthly points with two empty months and one month without a score
+        history_frame(ai, [('2024-01-10', 50, 3, 3), ('2024-02-10', 60, 3, 3),
+                           ('2024-03-10', None, 3, 3), ('2024-06-10', 100, 3, 3)]),
+        history_frame(vip, [('2024-01-10', 70, 3, 3)]),
+    ]))
+
+    trend = db.get_program_performance_trend('month').set_index(['program', 'period'])
+
+    assert trend.loc['AI', 'assessment_trend'].tolist() == pytest.approx([50, 60, 70, 100])
+    # A single period has no trend
+    assert pd.isna(trend.loc[('VIP', '2024-01'), 'assessment_trend'])
+
+
+def test_program_trend_by_week_across_new_year(db, add_students):
+    [sid] = add_students(1)
+    db.import_performance_history(history_frame(sid, [('2024-12-16', 40, 3, 3), ('2025-01-13', 60, 3, 3),
+                                                      ('2025-01-20', 65, 3, 3)]))
+
+    trend = db.get_program_performance_trend('week')
+
+    assert trend['assessment_trend'].tolist() == pytest.approx([40, 60, 65])
+
+
+@pytest.mark.parametrize('header, missing', [
+    ("recorded_at,assessment_score", "student_id or email"),
+    ("email,assessment_score", "recorded_at"),
+])
+def test_import_names_missing_columns(db, header, missing):
+    export = io.StringIO(f"{header}\nx,1\n")
+
+    with pytest.raises(ValueError, match=missing):
+        db.import_performance_history(export)
+
+
+def test_import_rejects_bad_dates_from_csv(db, add_students):
+    [sid] = add_students(1)
+
+    with pytest.raises(ValueError):
+        db.import_performance_history(io.StringIO(f"student_id,recorded_at,assessment_score\n{sid},someday,80\n"))
@@ -0,0 +1,236 @@
+import io
+
+import pandas as pd
+import pytest
+
+from t2r_reconciliation import read_statement
+
+
+def statement(*lines):
+    return io.StringIO("transaction_id,date,amount,email\n" + "".join(f"{line}\n" for line in lines))
+
+
+SGML_OFX = """OFXHEADER:100
+DATA:OFXSGML
+VERSION:102
+
+<OFX>
+<BANKMSGSRSV1><STMTTRNRS><STMTRS>
+<BANKTRANLIST>
+<DTSTART>20240301
+<STMTTRN>
+<TRNTYPE>CREDIT
+<DTPOSTED>20240301120000[-5:EST]
+<TRNAMT>497.00
+<FITID>TX1
+<NAME>Tuition
+</STMTTRN>
+<STMTTRN>
+<TRNTYPE>CREDIT
+<DTPOSTED>20240302
+<TRNAMT>1,297.00
+<FITID>TX2
+</STMTTRN>
+</BANKTRANLIST>
+</STMTRS></STMTTRNRS></BANKMSGSRSV1>
+</OFX>
+"""
+
+XML_OFX = """<?xml version="1.0" encoding="UTF-8"?>
+<?OFX OFXHEADER="200" VERSION="220"?>
+<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKTRANLIST>
+<STMTTRN><TRNTYPE>CREDIT</TRNTYPE><DTPOSTED>20240303000000.000[+1:CET]</DTPOSTED><TRNAMT>297.00</TRNAMT><FITID>TX3</FITID></STMTTRN>
+<STMTTRN>
+  <TRNTYPE>CREDIT</TRNTYPE>
+  <DTPOSTED>20240304</DTPOSTED>
+  <TRNAMT>2997</TRNAMT>
+  <FITID>TX4</FITID>
+</STMTTRN>
+</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>
+"""
+
+
+def ofx_rows(source, fmt='ofx'):
+    frame = pd.concat(list(read_statement(source, fmt)), ignore_index=True)
+    return list(frame[['transaction_id', 'payment_date', 'amount']].itertuples(index=False, name=None))
+
+
+def add_payment(db, student_id, amount, paid_on, method='Bank Transfer', transaction_id=''):
+    return db.conn.execute('''INSERT INTO payments (student_id, amount, payment_date, method, transaction_id)
+                           VALUES (?, ?, ?, ?, ?)''', (student_id, amount, paid_on, method, transaction_id)).lastrowid
+
+
+def statuses(result):
+    lines = result.lines.dropna(subset=['payment_id'])
+    return dict(zip(lines['payment_id'].astype(int), lines['status']))
+
+
+def test_only_the_statement_channel_can_be_missing(db, add_students):
+    [sid] = add_students(1)
+    bank = add_payment(db, sid, 497, '2024-03-01')
+    add_payment(db, sid, 297, '2024-03-02', method='PayPal')
+    db.conn.commit()
+
+    result = db.reconcile_payments(statement(",2024-03-01,497.00,"), fmt='csv')
+
+    assert result.summary == {'fuzzy_match': 1}
+    assert statuses(result) == {bank: 'fuzzy_match'}
+
+
+def test_statuses(db, add_students):
+    ana, ben, cat = add_students(3)
+    matched = add_payment(db, ana, 497, '2024-03-01', transaction_id='TX1')
+    drifted = add_payment(db, ana, 100, '2024-03-02', transaction_id='TX2')
+    other_student = add_payment(db, ben, 297, '2024-03-03', transaction_id='TX3')
+    fuzzy = add_payment(db, cat, 1297, '2024-03-04')
+    deleted = add_payment(db, ben, 50, '2024-03-05', transaction_id='TX5')
+    forgotten = add_payment(db, cat, 75, '2024-03-06')
+    db.conn.commit()
+    db.delete_payment(deleted)
+
+    result = db.reconcile_payments(statement(
+        "TX1,2024-03-01,497.00,",
+        "TX1,2024-03-01,497.00,",
+        "TX2,2024-03-02,120.00,",
+        "TX3,2024-03-03,297.00,s0@example.com",
+        ",2024-03-06,1297.00,",
+        "TX5,2024-03-05,50.00,",
+        "TX9,2024-03-07,10.00,s1@example.com",
+    ), fmt='csv')
+
+    lines = result.lines.dropna(subset=['line_no']).set_index('line_no')['status'].to_dict()
+    assert lines == {1: 'matched', 2: 'duplicate_statement_line', 3: 'amount_mismatch', 4: 'student_mismatch',
+                     5: 'fuzzy_match', 6: 'deleted_payment', 7: 'missing_in_db'}
+    assert statuses(result)[forgotten] == 'missing_in_statement'
+    assert statuses(result)[fuzzy] == 'fuzzy_match'
+    assert {matched, drifted, other_student} <= set(statuses(result))
+
+
+def test_fuzzy_pairs_repeated_amounts_by_date(db, add_students):
+    students = add_students(4)
+    payments = [add_payment(db, sid, 497, f"2024-03-{day:02d}") for sid, day in zip(students, (1, 10, 20, 28))]
+    db.conn.commit()
+
+    # Same program price on every line, each within the tolerance of exactly one payment
+    result = db.reconcile_payments(statement(",2024-03-29,497,", ",2024-03-02,497,",
+                                             ",2024-03-12,497,", ",2024-03-15,497,"),
+                                   fmt='csv', date_tolerance_days=3)
+
+    pairs = result.lines.dropna(subset=['line_no', 'payment_id'])
+    assert dict(zip(pairs['line_no'], pairs['payment_id'])) == {1: payments[3], 2: payments[0], 3: payments[1]}
+    assert result.summary == {'fuzzy_match': 3, 'missing_in_db': 1, 'missing_in_statement': 1}
+
+
+def test_fuzzy_match_respects_named_student(db, add_students):
+    ana, ben = add_students(2)
+    add_payment(db, ana, 497, '2024-03-01')
+    bens = add_payment(db, ben, 497, '2024-03-03')
+    db.conn.commit()
+
+    result = db.reconcile_payments(statement(",2024-03-01,497,s1@example.com"), fmt='csv')
+
+    assert statuses(result)[bens] == 'fuzzy_match'
+    assert result.summary == {'fuzzy_match': 1, 'missing_in_statement': 1}
+
+
+def test_deleted_students_and_payments(db, add_students):
+    [old] = add_students(1)
+    db.record_payment(old, 497, transaction_id='TX1')
+    db.delete_student(old)
+    db.add_student("again", "s0@example.com", None, 'AI', 'Unpaid', 0, 'Facebook')
+    again = old + 1
+    db.record_payment(again, 497, transaction_id='TX1')
+    active = db.conn.execute("SELECT id FROM payments WHERE deleted_at IS NULL").fetchone()[0]
+
+    result = db.reconcile_payments(statement("TX1,2024-03-01,497.00,",
+                                             "TX2,2024-03-01,100.00,s0@example.com",
+                                             "TX3,2024-03-01,50.00,"), fmt='csv', apply_corrections=True)
+
+    # The live payment wins over its deleted twin, and the email resolves to the live student
+    lines = result.lines.dropna(subset=['line_no']).set_index('line_no')
+    assert lines.loc[1, 'status'] == 'matched' and lines.loc[1, 'payment_id'] == active
+    assert lines.loc[2, 'student_id'] == again
+    assert 'duplicate_payment' not in result.summary
+    assert db.get_total_paid(again) == 597
+
+
+def test_corrections_skip_deleted_students(db, add_students):
+    [sid] = add_students(1)
+    db.delete_student(sid)
+
+    result = db.reconcile_payments(io.StringIO(f"transaction_id,date,amount,student_id\nTX1,2024-03-01,497,{sid}\n"),
+                                   fmt='csv', apply_corrections=True)
+
+    assert result.summary == {'missing_in_db': 1}
+    assert result.corrections == 0
+    assert db.conn.execute("SELECT COUNT(*) FROM payments").fetchone()[0] == 0
+
+
+def test_dry_run_leaves_students_untouched(db):
+    db.add_student('a', 'a@x', None, 'AI', 'Paid', 497, 'Facebook')
+    before = db.conn.execute("SELECT * FROM students").fetchall()
+
+    result = db.reconcile_payments(statement("TX1,2024-01-01,497,a@x"), fmt='csv')
+
+    assert result.summary == {'missing_in_db': 1}
+    assert db.conn.execute("SELECT * FROM students").fetchall() == before
+
+
+def test_corrections_only_recompute_changed_students(db, add_students):
+    corrected, backfilled = add_students(2)
+    add_payment(db, corrected, 400, '2024-03-01', transaction_id='TX1')
+    add_payment(db, backfilled, 100, '2024-03-02')
+    # A manually entered balance that no payment row backs up
+    db.conn.execute("UPDATE students SET amount_paid = 300, payment_status = 'Partial' WHERE id = ?", (backfilled,))
+    db.conn.commit()
+
+    result = db.reconcile_payments(statement("TX1,2024-03-01,497.00,", "TX2,2024-03-02,100.00,"),
+                                   fmt='csv', apply_corrections=True)
+
+    assert result.corrections == 2
+    assert db.get_student(corrected)['payment_status'] == 'Paid'
+    assert db.get_student(backfilled)['amount_paid'] == 300
+    assert db.conn.execute("SELECT transaction_id FROM payments WHERE student_id = ?", (backfilled,)).fetchone() == ('TX2',)
+
+
+def test_empty_statement_reports_nothing(db):
+    result = db.reconcile_payments(io.StringIO("transaction_id,date,amount\n"), fmt='csv')
+
+    assert result.lines.empty
+    assert list(result.lines.columns)[:2] == ['status', 'line_no']
+    assert result.summary == {}
+
+
+def test_statement_without_amount_column_is_rejected(db):
+    export = io.StringIO("Date,Description,Debit,Credit\n2024-03-01,Tuition,,497.00\n")
+
+    with pytest.raises(ValueError, match="no amount column"):
+        db.reconcile_payments(export, fmt='csv')
+
+    assert db.conn.execute("SELECT name FROM sqlite_temp_master WHERE name = 'statement_lines'").fetchone() is None
+
+
+def test_sgml_ofx_with_unclosed_tags(tmp_path):
+    path = tmp_path / 'statement.ofx'
+    path.write_text(SGML_OFX, encoding='latin-1')
+
+    assert ofx_rows(str(path), fmt=None) == [('TX1', '2024-03-01', 497.0), ('TX2', '2024-03-02', 1297.0)]
+
+
+def test_xml_ofx_with_timezone_suffix():
+    assert ofx_rows(io.StringIO(XML_OFX)) == [('TX3', '2024-03-03', 297.0), ('TX4', '2024-03-04', 2997.0)]
+
+
+def test_uploaded_ofx_file(db, add_students):
+    [sid] = add_students(1)
+    payment = add_payment(db, sid, 497, '2024-03-01', transaction_id='TX1')
+    db.conn.commit()
+    # Streamlit hands over a BytesIO subclass that carries the original file name
+    upload = io.BytesIO(SGML_OFX.encode('latin-1'))
+    upload.name = 'statement.QFX'
+
+    result = db.reconcile_payments(upload)
+
+    assert statuses(result) == {payment: 'matched'}
+    assert result.summary == {'matched': 1, 'missing_in_db': 1}
+
@@ -0,0 +1,55 @@
+import pytest
+
+from t2r_reports import ReportPDF, ReportSection
+
+
+class FailingFigure:
+    def __init__(self, error):
+        self.error = error
+
+    def to_image(self, **kwargs):
+        raise self.error
+
+
+def test_include_roster_appends_roster_to_template(db, add_students, tmp_path, monkeypatch):
+    add_students(3)
+    roster_calls = []
+    iter_student_roster = db.iter_student_roster
+    monkeypatch.setattr(db, 'iter_student_roster',
+                        lambda chunk_size: roster_calls.append(chunk_size) or iter_student_roster(chunk_size))
+    campaign_loads = []
+    calculate_roi = db.calculate_roi
+    monkeypatch.setattr(db, 'calculate_roi', lambda: campaign_loads.append(1) or calculate_roi())
+
+    db.generate_report('monthly', include_roster=True, filename=str(tmp_path / 'monthly.pdf'))
+
+    # The monthly sections are still rendered, followed by the roster
+    assert campaign_loads == [1]
+    assert len(roster_calls) == 1
+
+
+def test_chart_failure_reports_reason():
+    pdf = ReportPDF("Test")
+    pdf.add_page()
+    written = []
+    pdf.multi_cell = lambda w, h, txt='', **kwargs: written.append(txt)
+
+    pdf.chart(FailingFigure(ValueError("Image export requires the kaleido package\nRun pip install kaleido")))
+
+    assert written == ["Chart unavailable: Image export requires the kaleido package"]
+
+
+def test_chart_does_not_hide_unexpected_errors():
+    pdf = ReportPDF("Test")
+    pdf.add_page()
+
+    with pytest.raises(TypeError):
+        pdf.chart(FailingFigure(TypeError("bad figure")))
+
+
+def test_report_section_requires_render():
+    class Incomplete(ReportSection):
+        title = "Incomplete"
+
+    with pytest.raises(TypeError):
+        Incomplete()
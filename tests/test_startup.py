@@ -0,0 +1,18 @@
+import json
+import os
+import subprocess
+import sys
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_database_module_imports_without_heavy_dependencies():
+    # A fresh interpreter: pytest itself may already have these modules loaded
+    script = ("import json, sys\n"
+              "import t2r_database\n"
+              "print(json.dumps([m for m in ('sklearn', 'fpdf', 'plotly', 't2r_reports', 't2r_reconciliation')\n"
+              "                  if m in sys.modules]))\n")
+    completed = subprocess.run([sys.executable, '-c', script], cwd=REPO_DIR,
+                               capture_output=True, text=True, check=True)
+
+    assert json.loads(completed.stdout) == []